@@ -19,8 +19,6 @@ __author__ = "Randy Heiland"
 import sys
 import glob
 import os
-import xml.etree.ElementTree as ET
-import math
 join_our_list = "(Join/ask questions at https://groups.google.com/forum/#!forum/physicell-users)\n"
 try:
   import matplotlib
@@ -40,7 +38,7 @@ except:
   print("---Try: python -m pip install numpy\n")
   print(join_our_list)
   raise
-from collections import deque
+from svg_snapshot import read_svg_snapshot, palette_to_rgb
 try:
   # apparently we need mpl's Qt backend to do keypresses 
 #  matplotlib.use("Qt5Agg")
@@ -211,108 +209,25 @@ def plot_svg():
     print("File does not exist: ",fname)
     return
 
-  xlist = deque()
-  ylist = deque()
-  rlist = deque()
-  rgb_list = deque()
-
-#  print('\n---- ' + fname + ':')
-  tree = ET.parse(fname)
-  root = tree.getroot()
-#  print('--- root.tag ---')
-#  print(root.tag)
-#  print('--- root.attrib ---')
-#  print(root.attrib)
-
-
-#  print('--- child.tag, child.attrib ---')
-  numChildren = 0
-  for child in root:
-#    print(child.tag, child.attrib)
-#    print("keys=",child.attrib.keys())
-    if use_defaults and ('width' in child.attrib.keys()):
-      axes_max = float(child.attrib['width'])
-#      print("--- found width --> axes_max =", axes_max)
-    if child.text and "Current time" in child.text:
-      svals = child.text.split()
-      title_str = "(" + str(current_idx) + ") Current time: " + svals[2] + "d, " + svals[4] + "h, " + svals[7] + "m"
-
-#    print("width ",child.attrib['width'])
-#    print('attrib=',child.attrib)
-#    if (child.attrib['id'] == 'tissue'):
-    if ('id' in child.attrib.keys()):
-#      print('-------- found tissue!!')
-      tissue_parent = child
-      break
-
-#  print('------ search tissue')
-  cells_parent = None
-
-  for child in tissue_parent:
-#    print('attrib=',child.attrib)
-    if (child.attrib['id'] == 'cells'):
-#      print('-------- found cells, setting cells_parent')
-      cells_parent = child
-      break
-    numChildren += 1
-
-
-  num_cells = 0
-#  print('------ search cells')
-  for child in cells_parent:
-#    print(child.tag, child.attrib)
-#    print('attrib=',child.attrib)
-    for circle in child:  # two circles in each child: outer + nucleus
-    #  circle.attrib={'cx': '1085.59','cy': '1225.24','fill': 'rgb(159,159,96)','r': '6.67717','stroke': 'rgb(159,159,96)','stroke-width': '0.5'}
-#      print('  --- cx,cy=',circle.attrib['cx'],circle.attrib['cy'])
-      xval = float(circle.attrib['cx'])
-
-      s = circle.attrib['fill']
-#      print("s=",s)
-#      print("type(s)=",type(s))
-      if (s[0:3] == "rgb"):  # if an rgb string, e.g. "rgb(175,175,80)" 
-        rgb = list(map(int, s[4:-1].split(",")))  
-        rgb[:]=[x/255. for x in rgb]
-      else:     # otherwise, must be a color name
-        rgb_tuple = mplc.to_rgb(mplc.cnames[s])  # a tuple
-        rgb = [x for x in rgb_tuple]
-
-      # test for bogus x,y locations (rwh TODO: use max of domain?)
-      too_large_val = 10000.
-      if (math.fabs(xval) > too_large_val):
-        print("bogus xval=",xval)
-        break
-      yval = float(circle.attrib['cy'])
-      if (math.fabs(yval) > too_large_val):
-        print("bogus xval=",xval)
-        break
-
-      rval = float(circle.attrib['r'])
-#      print('rval=',rval)
-
-      xlist.append(xval)
-      ylist.append(yval)
-      rlist.append(rval)
-      rgb_list.append(rgb)
-#      print('rgb_list = ',rgb_list)
-
-#     For .svg files with cells that *have* a nucleus, there will be a 2nd
-      if (show_nucleus == 0):
-        break
-
-    num_cells += 1
-
-#    if num_cells > 3:   # for debugging
-#      print(fname,':  num_cells= ',num_cells," --- debug exit.")
-#      sys.exit(1)
-#      break
+  snapshot = read_svg_snapshot(fname, nucleus=(show_nucleus != 0))
+  if use_defaults:
+    axes_max = snapshot['width']
+  svals = snapshot['time'].split()
+  title_str = "(" + str(current_idx) + ") Current time: " + svals[2] + "d, " + svals[4] + "h, " + svals[7] + "m"
 
+  # test for bogus x,y locations (rwh TODO: use max of domain?)
+  too_large_val = 10000.
+  valid = (np.fabs(snapshot['cx']) <= too_large_val) & (np.fabs(snapshot['cy']) <= too_large_val)
+  for xval in snapshot['cx'][~valid]:
+    print("bogus xval=",xval)
+
+  num_cells = snapshot['n_cells']
   print(fname,':  num_cells= ',num_cells)
 
-  xvals = np.array(xlist)
-  yvals = np.array(ylist)
-  rvals = np.array(rlist)
-  rgbs =  np.array(rgb_list)
+  xvals = snapshot['cx'][valid]
+  yvals = snapshot['cy'][valid]
+  rvals = snapshot['r'][valid]
+  rgbs = palette_to_rgb(snapshot['palette'])[snapshot['fill'][valid]]
 #  print('type(rgbs) = ',type(rgbs))
 #  print('rgbs = ',rgbs)
 #print("xvals[0:5]=",xvals[0:5])
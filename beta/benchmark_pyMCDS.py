@@ -0,0 +1,168 @@
+#
+# benchmark_pyMCDS.py - time pyMCDS loading on a synthetic PhysiCell output
+#
+# Usage:
+#  python benchmark_pyMCDS.py [n_voxels_per_axis [n_substrates [n_cells]]]
+#
+# Writes one synthetic 3D output frame (initial_mesh0.mat, output00000000.xml,
+# output00000000_microenvironment0.mat and output00000000_cells.mat) into a
+# temporary directory and times how long it takes to read it back.
+#
+# Examples (run from the /beta directory):
+#  python benchmark_pyMCDS.py            # 75 x 75 x 75 voxels, 3 substrates
+#  python benchmark_pyMCDS.py 40 2 5000
+#
+import sys
+import time
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+import scipy.io as sio
+
+from pyMCDS import pyMCDS
+
+# a representative subset of the labels PhysiCell writes for each cell
+cell_labels = [('ID', 1), ('position', 3), ('total_volume', 1), ('cell_type', 1),
+               ('cycle_model', 1), ('current_phase', 1), ('elapsed_time_in_phase', 1),
+               ('nuclear_volume', 1), ('cytoplasmic_volume', 1), ('dead', 1),
+               ('velocity', 3), ('orientation', 3)]
+
+
+def write_synthetic_output(output_path, n_vox=75, n_substrates=3, n_cells=10000,
+                           n_frames=1, dx=20., seed=0):
+    """
+    Writes n_frames PhysiCell-style output frames over an n_vox^3 mesh into
+    output_path. Voxels are stored in BioFVM order (x fastest, then y, then z)
+    and all .mat files are MATLAB level 4, like PhysiCell writes them.
+    """
+    rng = np.random.default_rng(seed)
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    coords = (np.arange(n_vox) - (n_vox - 1) / 2.) * dx
+    zz, yy, xx = np.meshgrid(coords, coords, coords, indexing='ij')
+    centers = np.vstack((xx.ravel(), yy.ravel(), zz.ravel()))
+    volumes = np.full((1, centers.shape[1]), dx**3)
+    sio.savemat(output_path / 'initial_mesh0.mat',
+                {'mesh': np.vstack((centers, volumes))}, format='4')
+
+    substrates = ['substrate_{}'.format(n) for n in range(n_substrates)]
+    n_rows = sum(size for _, size in cell_labels)
+    types = ['type_{}'.format(n) for n in range(3)]
+
+    for frame in range(n_frames):
+        base = 'output{:08d}'.format(frame)
+
+        conc = rng.random((n_substrates, centers.shape[1]))
+        sio.savemat(output_path / (base + '_microenvironment0.mat'),
+                    {'multiscale_microenvironment': np.vstack((centers, volumes, conc))},
+                    format='4')
+
+        cells = rng.random((n_rows, n_cells))
+        cells[0, :] = np.arange(n_cells)
+        cells[1:4, :] = (cells[1:4, :] - 0.5) * n_vox * dx
+        cells[5, :] = rng.integers(0, len(types), n_cells)
+        cells[7, :] = rng.choice([14, 100, 101], n_cells)
+        cells[11, :] = cells[7, :] >= 100
+        sio.savemat(output_path / (base + '_cells.mat'), {'cells': cells}, format='4')
+
+        root = ET.Element('MultiCellDS', version='2', type='snapshot/simulation')
+        metadata = ET.SubElement(root, 'metadata')
+        ET.SubElement(metadata, 'current_time', units='min').text = str(60. * frame)
+        ET.SubElement(metadata, 'current_runtime', units='sec').text = str(1. * frame)
+
+        domain = ET.SubElement(ET.SubElement(root, 'microenvironment'), 'domain',
+                               name='microenvironment')
+        mesh = ET.SubElement(domain, 'mesh', type='Cartesian', uniform='true',
+                             regular='true', units='micron')
+        for axis in ('x', 'y', 'z'):
+            ET.SubElement(mesh, axis + '_coordinates', delimiter=' ').text = \
+                ' '.join('{:g}'.format(c) for c in coords)
+        voxels = ET.SubElement(mesh, 'voxels', type='matlab')
+        ET.SubElement(voxels, 'filename').text = 'initial_mesh0.mat'
+
+        variables = ET.SubElement(domain, 'variables')
+        for si, name in enumerate(substrates):
+            variable = ET.SubElement(variables, 'variable', name=name,
+                                     units='dimensionless', ID=str(si))
+            params = ET.SubElement(variable, 'physical_parameter_set')
+            ET.SubElement(params, 'diffusion_coefficient',
+                          units='micron^2/min').text = '1000'
+            ET.SubElement(params, 'decay_rate', units='1/min').text = '0.1'
+        data = ET.SubElement(domain, 'data', type='matlab')
+        ET.SubElement(data, 'filename').text = base + '_microenvironment0.mat'
+
+        custom = ET.SubElement(ET.SubElement(ET.SubElement(ET.SubElement(
+            root, 'cellular_information'), 'cell_populations'), 'cell_population',
+            type='individual'), 'custom')
+        simplified = ET.SubElement(custom, 'simplified_data', type='matlab',
+                                   source='PhysiCell', data_version='2')
+        cell_types = ET.SubElement(simplified, 'cell_types')
+        for ti, name in enumerate(types):
+            ET.SubElement(cell_types, 'type', ID=str(ti), type=str(ti)).text = name
+        labels = ET.SubElement(simplified, 'labels')
+        index = 0
+        for name, size in cell_labels:
+            ET.SubElement(labels, 'label', index=str(index), size=str(size),
+                          units='none').text = name
+            index += size
+        ET.SubElement(simplified, 'filename').text = base + '_cells.mat'
+
+        ET.ElementTree(root).write(output_path / (base + '.xml'))
+
+    return output_path
+
+
+def loop_microenvironment(mcds, me_data):
+    """
+    The per-voxel loop pyMCDS used to fill each species' meshgrid, kept here
+    as the 'before' reference.
+    """
+    xx, yy, zz = mcds.get_mesh()
+    X, Y, Z = np.unique(xx), np.unique(yy), np.unique(zz)
+    centers = mcds.get_linear_voxels()
+    out = {}
+    for si, species_name in enumerate(mcds.get_substrate_names()):
+        out[species_name] = np.zeros(xx.shape)
+        for vox_idx in range(centers.shape[1]):
+            center = centers[:, vox_idx]
+
+            i = np.where(np.abs(center[0] - X) < 1e-10)[0][0]
+            j = np.where(np.abs(center[1] - Y) < 1e-10)[0][0]
+            k = np.where(np.abs(center[2] - Z) < 1e-10)[0][0]
+
+            out[species_name][j, i, k] = me_data[4+si, vox_idx]
+    return out
+
+
+if __name__ == '__main__':
+    n_vox = int(sys.argv[1]) if len(sys.argv) > 1 else 75
+    n_substrates = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    n_cells = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print('Writing synthetic output: {0}^3 voxels, {1} substrates, {2} cells'.format(
+            n_vox, n_substrates, n_cells))
+        write_synthetic_output(tmp_dir, n_vox, n_substrates, n_cells)
+
+        t0 = time.perf_counter()
+        mcds = pyMCDS('output00000000.xml', tmp_dir, lazy=False)
+        t_first = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pyMCDS('output00000000.xml', tmp_dir, lazy=False)
+        t_cached = time.perf_counter() - t0
+
+        me_data = sio.loadmat(Path(tmp_dir, 'output00000000_microenvironment0.mat'))['multiscale_microenvironment']
+        t0 = time.perf_counter()
+        reference = loop_microenvironment(mcds, me_data)
+        t_loop = time.perf_counter() - t0
+
+        for name in mcds.get_substrate_names():
+            assert np.array_equal(reference[name], mcds.get_concentrations(name)), name
+
+        print('\nper-voxel loop (before), microenvironment only: {:8.3f} s'.format(t_loop))
+        print('pyMCDS full frame, first read (after):          {:8.3f} s'.format(t_first))
+        print('pyMCDS full frame, cached voxel map (after):    {:8.3f} s'.format(t_cached))
@@ -12,11 +12,11 @@
 # Author: Randy Heiland
 #
 import sys
-import xml.etree.ElementTree as ET
 import numpy as np
 import glob
 import matplotlib.pyplot as plt
-import math
+
+from svg_snapshot import read_svg_snapshot
 
 
 #print(len(sys.argv))
@@ -30,19 +30,13 @@ if (len(sys.argv) < 2):
 else:
    maxCount = int(sys.argv[1])
 
-d={}   # dictionary to hold all (x,y) positions of cells
-
-""" 
---- for example ---
-In [141]: d['cell1599'][0:3]
-Out[141]: 
-array([[ 4900.  ,  4900.  ],
-       [ 4934.17,  4487.91],
-       [ 4960.75,  4148.02]])
-"""
+# IDs and (x,y) positions of the cells of every frame
+ids = [np.zeros(0, dtype=np.int64)]
+xs = [np.zeros(0)]
+ys = [np.zeros(0)]
 
 count = 0
-for fname in glob.glob('snapshot*.svg'):
+for fname in sorted(glob.glob('snapshot*.svg')):
 #for fname in['snapshot00000000.svg', 'snapshot00000001.svg']:
 #for fname in['snapshot00000000.svg']:
 #  print(fname)
@@ -50,65 +44,24 @@ for fname in glob.glob('snapshot*.svg'):
   if count > maxCount:
     break
 
-#  print('\n---- ' + fname + ':')
-  tree=ET.parse(fname)
-
-#  print('--- root.tag, root.attrib ---')
-  root=tree.getroot()
-#  print('--- root.tag ---')
-#  print(root.tag)
-#  print('--- root.attrib ---')
-#  print(root.attrib)
-
-
-#  print('--- child.tag, child.attrib ---')
-  numChildren = 0
-  for child in root:
-#  print(child.tag, child.attrib)
-#    print('attrib=',child.attrib)
-#  if (child.attrib['id'] == 'tissue'):
-    if ('id' in child.attrib.keys()):
-#      print('-------- found tissue!!')
-      tissue_parent = child
-      break
-
-#  print('------ search tissue')
-  for child in tissue_parent:
-#    print('attrib=',child.attrib)
-    if (child.attrib['id'] == 'cells'):
-#      print('-------- found cells!!')
-      cells_parent = child
-      break
-    numChildren += 1
-
+  snapshot = read_svg_snapshot(fname)
 
-  num_cells = 0
-#  print('------ search cells')
-  for child in cells_parent:
-#    print(child.tag, child.attrib)
-#    print('attrib=',child.attrib)
-    for circle in child:
-#      print('  --- cx,cy=',circle.attrib['cx'],circle.attrib['cy'])
-      xval = float(circle.attrib['cx'])
+  # should we test for bogus x,y locations??
+  valid = (np.fabs(snapshot['cx']) <= 10000.) & (np.fabs(snapshot['cy']) <= 10000.)
+  for xval in snapshot['cx'][~valid]:
+    print("xval=",xval)
+  ids.append(snapshot['ID'][valid])
+  xs.append(snapshot['cx'][valid])
+  ys.append(snapshot['cy'][valid])
+  print(fname,':  num_cells= ',snapshot['n_cells'])
 
-      # should we test for bogus x,y locations??
-      if (math.fabs(xval) > 10000.):
-        print("xval=",xval)
-        break
-      yval = float(circle.attrib['cy'])
-      if (math.fabs(yval) > 10000.):
-        print("xval=",xval)
-        break
-      if (child.attrib['id'] in d.keys()):
-        d[child.attrib['id']] = np.vstack((d[child.attrib['id']], [ float(circle.attrib['cx']), float(circle.attrib['cy']) ]))
-      else:
-        d[child.attrib['id']] = np.array( [ float(circle.attrib['cx']), float(circle.attrib['cy']) ])
-      break
-#    if (child.attrib['id'] == 'cells'):
-#      print('-------- found cells!!')
-#      tissue_child = child
-    num_cells += 1
-  print(fname,':  num_cells= ',num_cells)
+# group the positions by cell, a stable sort keeps each track in frame order
+ids = np.concatenate(ids)
+order = np.argsort(ids, kind='stable')
+ids = ids[order]
+positions = np.column_stack((np.concatenate(xs)[order], np.concatenate(ys)[order]))
+starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) > 0 else []
+tracks = np.split(positions, starts[1:])
 
 
 fig = plt.figure(figsize=(8,8))
@@ -122,16 +75,13 @@ ax.set_aspect("equal")
 #fig.set_figwidth(8)
 #fig.set_figheight(8)
 
-for key in d.keys():
-  if (len(d[key].shape) == 2):
-    x = d[key][:,0]
-    y = d[key][:,1]
+for cell_id, track in zip(ids[starts], tracks):
+  if (track.shape[0] > 1):
+    x = track[:,0]
+    y = track[:,1]
     plt.plot(x,y)
   else:
-    print(key, " has no x,y points")
-#    print(" d[",key,"].shape=", d[key].shape)
-#    print(" d[",key,"].size=", d[key].size)
-#    print( d[key])
+    print('cell%d' % cell_id, " has no x,y points")
 
 title_str = " max # SVG frames: " + str(maxCount)
 plt.title(title_str)
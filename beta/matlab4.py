@@ -0,0 +1,103 @@
+"""
+Minimal reader for the MATLAB level 4 .mat files written by BioFVM/PhysiCell
+(rf. BioFVM/BioFVM_matlab.cpp). Each file holds one full, real matrix stored
+column by column, e.g. [n_labels, n_cells] for cells.mat, so the data block
+can be memory-mapped directly instead of being decoded.
+"""
+import numpy as np
+from pathlib import Path
+
+# the P digit of the MOPT type code
+_data_formats = {0: 'f8', 1: 'f4', 2: 'i4', 3: 'i2', 4: 'u2', 5: 'u1'}
+
+
+def read_matlab4_header(filename):
+    """
+    Parses the 20 byte header and the variable name of a level 4 .mat file
+
+    Parameters
+    ----------
+    filename : str
+        Path to the .mat file
+
+    Returns
+    -------
+    header : dict
+        Contains the variable 'name', the number of 'rows' and 'cols', the
+        numpy 'dtype' of the data and the byte 'offset' of the data block
+    """
+    with open(filename, 'rb') as f:
+        raw = f.read(20)
+        if len(raw) < 20:
+            raise ValueError("'{}' is too short to be a MATLAB level 4 file".format(filename))
+
+        # the M digit gives the byte order, try little-endian first
+        for byte_order in ('<', '>'):
+            mopt, rows, cols, imag, name_length = np.frombuffer(raw, dtype=byte_order + 'i4')
+            if 0 <= mopt < 5000 and mopt // 1000 == (0 if byte_order == '<' else 1):
+                break
+        else:
+            raise ValueError("'{}' is not a MATLAB level 4 file".format(filename))
+
+        reserved = (mopt % 1000) // 100
+        data_format = (mopt % 100) // 10
+        matrix_type = mopt % 10
+        if reserved != 0 or data_format not in _data_formats or matrix_type != 0:
+            raise ValueError("'{}' is not a full numeric MATLAB level 4 matrix".format(filename))
+        if imag != 0:
+            raise ValueError("'{}' holds a complex matrix, which is not supported".format(filename))
+
+        name = f.read(name_length).rstrip(b'\x00').decode('ascii')
+
+    return {'name': name, 'rows': int(rows), 'cols': int(cols),
+            'dtype': np.dtype(byte_order + _data_formats[data_format]),
+            'offset': 20 + int(name_length)}
+
+
+def memmap_matlab4(filename):
+    """
+    Memory-maps the matrix of a level 4 .mat file without reading it
+
+    Parameters
+    ----------
+    filename : str
+        Path to the .mat file
+
+    Returns
+    -------
+    matrix : np.memmap, shape=[rows, cols]
+        Read-only, column-major view of the data block on disk
+    """
+    header = read_matlab4_header(filename)
+    if header['rows'] * header['cols'] == 0:
+        return np.zeros((header['rows'], header['cols']), dtype=header['dtype'])
+    return np.memmap(filename, dtype=header['dtype'], mode='r', offset=header['offset'],
+                     shape=(header['rows'], header['cols']), order='F')
+
+
+def read_matlab4_rows(filename, rows=None, cols=None):
+    """
+    Reads a level 4 .mat matrix, or only some of its rows, into memory. Only
+    the requested rows are ever materialised.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the .mat file
+    rows : array (int), optional
+        Indices of the rows to read (default= all rows)
+    cols : slice or array (int), optional
+        Columns to read (default= all columns). Columns are contiguous on
+        disk, so a slice only touches that block of the file.
+
+    Returns
+    -------
+    matrix : array, shape=[len(rows), len(cols)]
+        Requested rows, as float64
+    """
+    matrix = memmap_matlab4(Path(filename))
+    if cols is not None:
+        matrix = matrix[:, cols]
+    if rows is None:
+        return np.array(matrix, dtype=float)
+    return np.array(matrix[np.asarray(rows, dtype=np.intp), :], dtype=float)
@@ -2,10 +2,329 @@ import xml.etree.ElementTree as ET
 import numpy as np
 import pandas as pd
 import scipy.io as sio
+import os
 import sys
+import tempfile
 import warnings
 from pathlib import Path
 
+from matlab4 import memmap_matlab4, read_matlab4_rows
+
+# voxel-center -> meshgrid index maps, keyed on the mesh file and its axes so
+# that every species and every frame sharing a mesh reuse the same map
+_voxel_index_cache = {}
+
+def _nearest_axis_index(axis, values):
+    """
+    Returns the index of the closest entry of the sorted 1D array axis for
+    each entry in values.
+    """
+    if axis.shape[0] == 1:
+        return np.zeros(values.shape, dtype=np.intp)
+
+    idx = np.searchsorted(axis, values).clip(1, axis.shape[0] - 1)
+    idx -= (values - axis[idx - 1]) < (axis[idx] - values)
+    return idx
+
+def _linear_axis_weights(axis, values):
+    """
+    Returns the indices of the two entries of the sorted 1D array axis that
+    bracket each entry in values, and the weight of the upper one for linear
+    interpolation. values must lie within [axis[0], axis[-1]].
+    """
+    if axis.shape[0] == 1:
+        zeros = np.zeros(values.shape, dtype=np.intp)
+        return zeros, zeros, np.zeros(values.shape)
+
+    lower = (np.searchsorted(axis, values, side='right') - 1).clip(0, axis.shape[0] - 2)
+    upper = lower + 1
+    weight = (values - axis[lower]) / (axis[upper] - axis[lower])
+    return lower, upper, weight
+
+def _get_voxel_index(voxel_path, centers, X, Y, Z):
+    """
+    Maps each voxel center (one column of centers) onto the flat index of the
+    matching [j, i, k] position of a meshgrid built from the X, Y and Z axes.
+    The map only depends on the mesh, so it is computed once and cached.
+
+    Parameters
+    ----------
+    voxel_path : pathlib.Path
+        Path to the mesh .mat file the voxel centers were read from
+    centers : array (float) shape=[3, n_voxels]
+        Voxel centers as stored in the mesh .mat file
+    X, Y, Z : array (float)
+        Sorted, unique voxel center coordinates along each axis
+
+    Returns
+    -------
+    flat_idx : array (int) shape=[n_voxels,]
+        Index into the raveled [ny_voxel, nx_voxel, nz_voxel] meshgrid
+    """
+    stat = voxel_path.stat()
+    key = (str(voxel_path.resolve()), stat.st_size, stat.st_mtime_ns,
+           X.tobytes(), Y.tobytes(), Z.tobytes())
+    if key in _voxel_index_cache:
+        return _voxel_index_cache[key]
+
+    i = _nearest_axis_index(X, centers[0, :])
+    j = _nearest_axis_index(Y, centers[1, :])
+    k = _nearest_axis_index(Z, centers[2, :])
+
+    for axis, idx, values in ((X, i, centers[0, :]), (Y, j, centers[1, :]),
+                              (Z, k, centers[2, :])):
+        if np.any(np.abs(axis[idx] - values) >= 1e-10):
+            raise ValueError(
+                "Voxel centers in '{}' do not match the mesh coordinates".format(voxel_path))
+
+    flat_idx = np.ravel_multi_index((j, i, k), (Y.shape[0], X.shape[0], Z.shape[0]))
+    _voxel_index_cache[key] = flat_idx
+    return flat_idx
+
+# cell variables that hold integer codes rather than measurements, stored as
+# compact integers when a reduced precision dtype is requested
+_integer_cell_variables = ('ID', 'parent_ID', 'cell_type', 'cycle_model', 'current_phase',
+                           'current_death_model', 'dead', 'number_of_nuclei')
+
+def _compact_integer(values):
+    """
+    Returns values cast to the smallest integer type that holds them exactly,
+    or None if they are not all integers.
+    """
+    if values.size == 0 or not np.all(np.isfinite(values)) or np.any(values != np.round(values)):
+        return None
+    int_type = np.promote_types(np.min_scalar_type(int(values.min())),
+                                np.min_scalar_type(int(values.max())))
+    return values.astype(int_type)
+
+# names of the cycle and death phase codes written to the current_phase row
+# (rf. core/PhysiCell_constants.cpp)
+_phase_names = {0: 'Ki67_positive_premitotic', 1: 'Ki67_positive_postmitotic',
+                2: 'Ki67_positive', 3: 'Ki67_negative', 4: 'G0G1_phase', 5: 'G0_phase',
+                6: 'G1_phase', 7: 'G1a_phase', 8: 'G1b_phase', 9: 'G1c_phase', 10: 'S_phase',
+                11: 'G2M_phase', 12: 'G2_phase', 13: 'M_phase', 14: 'live', 15: 'G1pm_phase',
+                16: 'G1ps_phase', 17: 'cycling', 18: 'quiescent', 100: 'apoptotic',
+                101: 'necrotic_swelling', 102: 'necrotic_lysed', 103: 'necrotic',
+                104: 'debris', 9999: 'custom_phase'}
+
+def _decode_categorical(codes, names):
+    """
+    Decodes an array of numeric codes into a pd.Categorical, with one category
+    per entry of names (code -> name) in code order. Codes missing from names
+    become categories named after their number.
+    """
+    codes = np.asarray(codes)
+    valid = np.isfinite(codes)
+    keys = np.union1d(list(names), np.unique(codes[valid]))
+    categories = [names.get(key, '{:g}'.format(key)) for key in keys]
+
+    cat_codes = np.full(codes.shape, -1, dtype=np.intp)
+    cat_codes[valid] = np.searchsorted(keys, codes[valid])
+    return pd.Categorical.from_codes(cat_codes, categories=categories)
+
+# phases of dead cells, used when the output has no 'dead' variable
+_dead_phases = (100, 101, 102, 103, 104)
+
+def _group_codes(codes):
+    """
+    Returns the sorted distinct values of an array of integer codes and the
+    index of each code into them. Codes spanning a small range (cell types,
+    phases) are grouped with a bincount instead of a sort.
+    """
+    codes = np.asarray(codes).astype(np.int64)
+    if codes.shape[0] == 0:
+        return codes, np.zeros(0, dtype=np.intp)
+    low = codes.min()
+    span = int(codes.max() - low) + 1
+    if span > 4 * codes.shape[0] + 65536:
+        values, inverse = np.unique(codes, return_inverse=True)
+        return values, inverse.reshape(-1)
+    present = np.bincount(codes - low, minlength=span) > 0
+    lookup = np.cumsum(present) - 1
+    return np.flatnonzero(present) + low, lookup[codes - low]
+
+# paths (below the root) of the xml fields that change from one time step to
+# the next, everything else is the same for the whole run. For the cells we
+# want the PhysiCell data, there is more of it
+_frame_fields = {
+    'metadata/current_time': 'current_time',
+    'metadata/current_runtime': 'current_runtime',
+    'microenvironment/domain/data/filename': 'microenvironment_file',
+    "cellular_information/cell_populations/cell_population/custom/"
+    "simplified_data[@source='PhysiCell']/filename": 'cells_file'}
+
+def _get_frame_fields(root):
+    """
+    Reads the fields of a time step (times and .mat file names) from the root
+    element of its xml.
+    """
+    fields = {}
+    for path, key in _frame_fields.items():
+        node = root.find(path)
+        if node is None:
+            continue
+        if key in ('current_time', 'current_runtime'):
+            fields[key] = float(node.text)
+            fields[key.replace('current_', '') + '_units'] = node.get('units')
+        else:
+            fields[key] = node.text
+    return fields
+
+# blocks of the xml that are the same for every time step of a run, they are
+# cut from the xml before it is parsed once the schema is known
+_schema_tags = (b'mesh', b'variables', b'cell_types', b'labels')
+
+def _strip_schema_blocks(data):
+    """
+    Returns the bytes of an xml without its schema blocks. Searching for the
+    tags is much cheaper than parsing the elements in between (the labels
+    alone are most of a PhysiCell xml), and the fields of a time step are all
+    outside of them.
+    """
+    for tag in _schema_tags:
+        parts = []
+        pos = 0
+        start = data.find(b'<' + tag)
+        while start >= 0:
+            end = start + len(tag) + 1
+            if data[end:end+1] not in (b'>', b' '):
+                # another tag starting with the same name
+                start = data.find(b'<' + tag, end)
+                continue
+            stop = data.find(b'</' + tag + b'>', end)
+            if stop < 0:
+                # incomplete xml, let the parser report it
+                break
+            parts.append(data[pos:start])
+            pos = stop + len(tag) + 3
+            start = data.find(b'<' + tag, pos)
+        parts.append(data[pos:])
+        data = b''.join(parts)
+    return data
+
+def _parse_schema(root):
+    """
+    Reads everything in the xml of a time step that is the same for every
+    time step of a run: the mesh coordinates, the chemical species and the
+    cell labels and types. The result can be shared by all time steps, see
+    the schema option of pyMCDS.
+    """
+    schema = {}
+
+    # find the mesh node
+    mesh_node = root.find('microenvironment').find('domain').find('mesh')
+    schema['spatial_units'] = mesh_node.get('units')
+    for axis in ('x', 'y', 'z'):
+        coord_node = mesh_node.find(axis + '_coordinates')
+        schema[axis + '_coordinates'] = np.array(
+            coord_node.text.split(coord_node.get('delimiter')), dtype=float)
+    schema['voxel_file'] = mesh_node.find('voxels').find('filename').text
+
+    # chemical species, with their units, diffusion and decay data
+    variables = []
+    variables_node = root.find('microenvironment').find('domain').find('variables')
+    for species in variables_node.findall('variable'):
+        variable = {'name': species.get('name'), 'units': species.get('units')}
+        species = species.find('physical_parameter_set')
+        for parameter in ('diffusion_coefficient', 'decay_rate'):
+            variable[parameter] = {'value': float(species.find(parameter).text),
+                                   'units': species.find(parameter).get('units')}
+        variables.append(variable)
+    schema['variables'] = variables
+
+    # in order to get to the good stuff we have to pass through a few different
+    # hierarchal levels
+    schema['data_labels'] = []
+    schema['cell_types'] = {}
+    cell_node = root.find('cellular_information')
+    if cell_node is None:
+        return schema
+    cell_node = cell_node.find('cell_populations')
+    cell_node = cell_node.find('cell_population')
+    cell_node = cell_node.find('custom')
+    # we want the PhysiCell data, there is more of it
+    for child in cell_node.findall('simplified_data'):
+        if child.get('source') == 'PhysiCell':
+            cell_node = child
+            break
+
+    # iterate over 'label's which are children of 'labels' these will be used to
+    # label data arrays
+    for label in cell_node.find('labels').findall('label'):
+        # I don't like spaces in my dictionary keys
+        fixed_label = label.text.replace(' ', '_')
+        if int(label.get('size')) > 1:
+            # tags to differentiate repeated labels (usually space related)
+            dir_label = ['_x', '_y', '_z']
+            for i in range(int(label.get('size'))):
+                schema['data_labels'].append(fixed_label + dir_label[i])
+        else:
+            schema['data_labels'].append(fixed_label)
+
+    # cell types, written by PhysiCell since version 1.14
+    types_node = cell_node.find('cell_types')
+    if types_node is not None:
+        for type_node in types_node.findall('type'):
+            schema['cell_types'][int(type_node.get('type'))] = type_node.text
+
+    return schema
+
+class _LazyMCDS(dict):
+    """
+    dict that fills in a key the first time it is accessed, by calling the
+    loader registered for it.
+    """
+    def __init__(self):
+        super().__init__()
+        self._loaders = {}
+
+    def add_loader(self, key, loader):
+        self._loaders[key] = loader
+
+    def load_all(self):
+        for key in list(self._loaders):
+            self[key]
+
+    def __missing__(self, key):
+        if key not in self._loaders:
+            raise KeyError('{} was not loaded, check the options passed to pyMCDS'.format(key))
+        value = self._loaders[key]()
+        del self._loaders[key]
+        self[key] = value
+        return value
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._loaders
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+class _Mesh(dict):
+    """
+    dict holding the mesh as three 1D axes ('x_axis', 'y_axis', 'z_axis').
+    The 'x_coordinates', 'y_coordinates' and 'z_coordinates' meshgrids are
+    not stored, they are produced on access as read-only broadcast views of
+    the axes, so they take no memory and are not pickled.
+    """
+    _meshgrid_keys = {'x_coordinates': 1, 'y_coordinates': 0, 'z_coordinates': 2}
+
+    def __missing__(self, key):
+        if key not in self._meshgrid_keys:
+            raise KeyError(key)
+        axes = (self['y_axis'], self['x_axis'], self['z_axis'])
+        view_shape = [1, 1, 1]
+        view_shape[self._meshgrid_keys[key]] = -1
+        # same [ny, nx, nz] layout as np.meshgrid(x, y, z)
+        return np.broadcast_to(
+            axes[self._meshgrid_keys[key]].reshape(view_shape),
+            tuple(axis.shape[0] for axis in axes))
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._meshgrid_keys
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
 class pyMCDS:
     """
     This class contains a dictionary of dictionaries that contains all of the 
@@ -20,6 +339,46 @@ class pyMCDS:
     output_path: str, optional
         String containing the path (relative or absolute) to the directory
         where PhysiCell output files are stored (default= ".")
+    microenv: bool, optional
+        If False, the microenvironment .mat file is never read and
+        data['continuum_variables'] is not available (default= True)
+    cells: bool, optional
+        If False, the cells .mat file is never read and data['discrete_cells']
+        is not available (default= True)
+    lazy: bool, optional
+        If True, the mesh, microenvironment and cell blocks are only read on
+        first access to data['mesh'], data['continuum_variables'] or
+        data['discrete_cells']. If False, they are all read up front
+        (default= True)
+    mesh: dict, optional
+        An already loaded data['mesh'] of another time step of the same run.
+        It is shared instead of being read again (default= None)
+    cache: bool or str, optional
+        If True, the cell and concentration arrays are written to .npy files in
+        a '.pyMCDS_cache' subdirectory of output_path the first time they are
+        read, and memory-mapped from there on later reads. A str is used as
+        the cache directory instead (default= False)
+    cell_variables: list (str), optional
+        Names of the cell variables to read, e.g. ['position', 'cell_type',
+        'current_phase']. Only these rows of the cells .mat file are read
+        into memory. Vector variables such as 'position' can be given by
+        their label or as 'position_x' etc. (default= None, all variables)
+    dtype: numpy dtype, optional
+        Floating point type of the concentration and cell arrays, e.g.
+        np.float32 to halve their memory. When it is given, integer coded cell
+        variables (ID, cell_type, current_phase, ...) are also stored as the
+        smallest integer type that holds them (default= None, float64)
+    memmap: bool, optional
+        If True, the cell variables and the voxel centers are read-only views
+        memory-mapped from the MultiCellDS v2 (MATLAB level 4) .mat files
+        instead of copies in memory. Opening a frame then takes constant time
+        and pages are only read from disk when the values are used
+        (default= False)
+    schema: dict, optional
+        The xml schema of another time step of the same run (its _schema
+        attribute). The labels, species and mesh coordinates are then taken
+        from it, and only the time and file names of this time step are read
+        from its xml (default= None)
 
     Attributes
     ----------
@@ -27,8 +386,36 @@ class pyMCDS:
         Hierarchical container for all of the data retrieved by parsing the xml
         file and the files referenced therein.
     """
-    def __init__(self, xml_file, output_path='.'):
-        self.data = self._read_xml(xml_file, output_path)
+    def __init__(self, xml_file, output_path='.', microenv=True, cells=True, lazy=True,
+                 mesh=None, cache=False, cell_variables=None, dtype=None, memmap=False,
+                 schema=None):
+        self._microenv = microenv
+        self._cells = cells
+        self._cell_variables = cell_variables
+        self._dtype = dtype
+        self._memmap = memmap
+        self._spatial_index = None
+        self._cell_fields = None
+        self._cell_df = None
+        self._cell_matrix = None
+        if cache is True:
+            self._cache_dir = Path(output_path) / '.pyMCDS_cache'
+        elif cache:
+            self._cache_dir = Path(cache)
+        else:
+            self._cache_dir = None
+        self.data = self._read_xml(xml_file, output_path, mesh, schema)
+        if not lazy:
+            self.data.load_all()
+
+    def __getstate__(self):
+        # the cell table, cell matrix, spatial index and cell fields are derived
+        # from data and rebuilt on demand, so they are not pickled (e.g. by
+        # worker pools)
+        state = self.__dict__.copy()
+        state.update(_cell_df=None, _cell_matrix=None, _spatial_index=None,
+                     _cell_fields=None)
+        return state
 
     ## METADATA RELATED FUNCTIONS
 
@@ -53,6 +440,7 @@ class pyMCDS:
         splitting : list length=2 if flat=True, else length=3
             Contains arrays of voxel center coordinates as meshgrid with shape 
             [nx_voxel, ny_voxel, nz_voxel] or [nx_voxel, ny_voxel] if flat=True.
+            The arrays are read-only views broadcast from the 1D mesh axes.
         """
         if flat == True:
             xx = self.data['mesh']['x_coordinates'][:, :, 0]
@@ -94,7 +482,8 @@ class pyMCDS:
     def get_mesh_spacing(self):
         """
         Returns the space in between voxel centers for the mesh in terms of the
-        mesh's spatial units. Assumes that voxel centers fall on integer values.
+        mesh's spatial units. The spacing along each axis is computed once
+        when the mesh is read, see data['mesh']['spacing'].
 
         Returns
         -------
@@ -102,20 +491,14 @@ class pyMCDS:
             Distance between voxel centers in the same units as the other 
             spatial measurements
         """
-        centers = self.get_linear_voxels()
-        X = np.unique(centers[0, :])
-        Y = np.unique(centers[1, :])
-        Z = np.unique(centers[2, :])
+        dx, dy, dz = self.data['mesh']['spacing']
 
-        dx = (X.max() - X.min()) / X.shape[0]
-        dy = (Y.max() - Y.min()) / Y.shape[0]
-        dz = (Z.max() - Z.min()) / Z.shape[0]
-        
-        if np.abs(dx - dy) > 1e-10 or np.abs(dy - dz) > 1e-10 \
-            or np.abs(dx - dz) > 1e-10:
+        # axes with a single voxel (2D runs) have no spacing of their own
+        spacing = [d for d in (dx, dy, dz) if d > 0]
+        if len(spacing) > 1 and np.ptp(spacing) > 1e-10:
             print('Warning: grid spacing may be axis dependent.')
-        
-        return round(dx)
+
+        return dx
 
     def get_containing_voxel_ijk(self, x, y, z):
         """
@@ -140,36 +523,31 @@ class pyMCDS:
         ijk : list length=3
             contains the i, j, and k indices for the containing voxel's center
         """
-        xx, yy, zz = self.get_mesh()
-        ds = self.get_mesh_spacing()
-
-        if x > xx.max():
-            warnings.warn('Position out of bounds: x out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting x = x_max!'.format(x, y, z))
-            x = xx.max()
-        elif x < xx.min():
-            warnings.warn('Position out of bounds: x out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting x = x_min!'.format(x, y, z))
-            x = xx.min()
-        elif y > yy.max():
-            warnings.warn('Position out of bounds: y out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting y = y_max!'.format(x, y, z))
-            y = yy.max()
-        elif y < yy.min():
-            warnings.warn('Position out of bounds: y out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting y = y_min!'.format(x, y, z))
-            y = yy.min()
-        elif z > zz.max():
-            warnings.warn('Position out of bounds: z out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting z = z_max!'.format(x, y, z))
-            z = zz.max()
-        elif z < zz.min():
-            warnings.warn('Position out of bounds: z out of bounds in pyMCDS._get_voxel_idx({0}, {1}, {2}). Setting z = z_min!'.format(x, y, z))
-            z = zz.min()
-        
-        i = np.round((x - xx.min()) / ds)
-        j = np.round((y - yy.min()) / ds)
-        k = np.round((z - zz.min()) / ds)
-
-        ii, jj, kk = int(i), int(j), int(k)
+        X, Y, Z = self._get_axes()
+        position = [x, y, z]
+
+        # clamp every axis that is out of bounds, not only the first one
+        for n, (axis, name) in enumerate(((X, 'x'), (Y, 'y'), (Z, 'z'))):
+            if position[n] > axis[-1]:
+                warnings.warn('Position out of bounds: {0} out of bounds in pyMCDS._get_voxel_idx({1}, {2}, {3}). Setting {0} = {0}_max!'.format(name, x, y, z))
+                position[n] = axis[-1]
+            elif position[n] < axis[0]:
+                warnings.warn('Position out of bounds: {0} out of bounds in pyMCDS._get_voxel_idx({1}, {2}, {3}). Setting {0} = {0}_min!'.format(name, x, y, z))
+                position[n] = axis[0]
+
+        ii = int(_nearest_axis_index(X, np.array([position[0]]))[0])
+        jj = int(_nearest_axis_index(Y, np.array([position[1]]))[0])
+        kk = int(_nearest_axis_index(Z, np.array([position[2]]))[0])
 
         return [ii, jj, kk]
 
+    def _get_axes(self):
+        """
+        Returns the sorted voxel center coordinates along the x, y and z axes
+        """
+        mesh = self.data['mesh']
+        return mesh['x_axis'], mesh['y_axis'], mesh['z_axis']
+
     ## MICROENVIRONMENT RELATED FUNCTIONS
 
     def get_substrate_names(self):
@@ -181,13 +559,13 @@ class pyMCDS:
         species_list : array (str), shape=[n_species,]
             Contains names of chemical species in microenvironment
         """
-        species_list = []
-        for name in self.data['continuum_variables']:
-            species_list.append(name)
+        # read the names from the xml, so that they are available without
+        # loading the microenvironment
+        species_list = [variable['name'] for variable in self._schema['variables']]
 
         return species_list
     
-    def get_concentrations(self, species_name, z_slice=None):
+    def get_concentrations(self, species_name, z_slice=None, from_file=False):
         """
         Returns the concentration array for the specified chemical species
         in the microenvironment. Can return either the whole 3D picture, or
@@ -201,21 +579,29 @@ class pyMCDS:
         z_slice : float
             z-axis position to use as plane for 2D output. This value must match
             a plane of voxel centers in the z-axis.
+
+        from_file : bool, optional
+            If True and the microenvironment has not been loaded yet, only the
+            voxels of the z_slice plane are read from the microenvironment
+            .mat file (default= False)
         Returns
         -------
-        conc_arr : array (np.float) shape=[nx_voxels, ny_voxels, nz_voxels]
+        conc_arr : array (float) shape=[nx_voxels, ny_voxels, nz_voxels]
             Contains the concentration of the specified chemical in each voxel.
             The array spatially maps to a meshgrid of the voxel centers.
         """
         if z_slice is not None:
             # check to see that z_slice is a valid plane
-            zz = self.data['mesh']['z_coordinates']
-            assert z_slice in zz, 'Specified z_slice {} not in z_coordinates'.format(z_slice)
-
-            # do the processing if its ok
-            mask = zz == z_slice
-            full_conc = self.data['continuum_variables'][species_name]['data']
-            conc_arr = full_conc[mask].reshape((zz.shape[0], zz.shape[1]))
+            Z = self.data['mesh']['z_axis']
+            k = np.flatnonzero(np.abs(Z - z_slice) < 1e-10)
+            assert k.shape[0] > 0, 'Specified z_slice {} not in z_coordinates'.format(z_slice)
+
+            if from_file and not dict.__contains__(self.data, 'continuum_variables'):
+                conc_arr = self._read_me_slab([species_name], k[0])[0]
+                if self._dtype is not None:
+                    conc_arr = conc_arr.astype(self._dtype)
+            else:
+                conc_arr = self.data['continuum_variables'][species_name]['data'][:, :, k[0]]
         else:
             conc_arr = self.data['continuum_variables'][species_name]['data']
 
@@ -240,29 +626,217 @@ class pyMCDS:
         concs : array, shape=[n_substrates,]
             array of concentrations in the order given by get_substrate_names()
         """
-        i, j, k = self.get_containing_voxel_ijk(x, y, z)
-        sub_name_list = self.get_substrate_names()
-        concs = np.zeros(len(sub_name_list))
+        concs = self.get_concentrations_at_points([[x, y, z]])[0]
 
-        for ix in range(len(sub_name_list)):
-            concs[ix] = self.get_concentrations(sub_name_list[ix])[j, i, k]
-        
         return concs
 
+    def get_concentrations_at_points(self, points, species_names=None, interpolation='nearest',
+                                     from_file=False):
+        """
+        Samples the concentration of each chemical species at many points in
+        one call, e.g. at the position of every cell. Points outside the mesh
+        are clamped onto its boundary along each axis.
+
+        Parameters
+        ----------
+        points : array (float) shape=[n_points, 3]
+            x, y and z positions of the points of interest
+        species_names : list (str), optional
+            Chemical species to sample (default= all, in the order given by
+            get_substrate_names())
+        interpolation : str, optional
+            'nearest' returns the value of the voxel containing each point,
+            'linear' interpolates trilinearly between the surrounding voxel
+            centers (default= 'nearest')
+        from_file : bool, optional
+            If True and the microenvironment has not been loaded yet, only the
+            voxels around the points are read from the microenvironment .mat
+            file (default= False)
+
+        Returns
+        -------
+        concs : array (float) shape=[n_points, n_species]
+            Concentrations at each point
+        """
+        if species_names is None:
+            species_names = self.get_substrate_names()
+
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        X, Y, Z = self._get_axes()
+        shape = (Y.shape[0], X.shape[0], Z.shape[0])
+
+        clamped = []
+        for n, axis in enumerate((X, Y, Z)):
+            values = points[:, n]
+            if np.any((values < axis[0]) | (values > axis[-1])):
+                warnings.warn('Position out of bounds: {} points clamped onto the mesh along {} in pyMCDS.get_concentrations_at_points'.format(
+                    np.count_nonzero((values < axis[0]) | (values > axis[-1])), 'xyz'[n]))
+            clamped.append(np.clip(values, axis[0], axis[-1]))
+
+        if interpolation == 'nearest':
+            i, j, k = (_nearest_axis_index(axis, values) for axis, values in zip((X, Y, Z), clamped))
+            corners = [(np.ravel_multi_index((j, i, k), shape), 1.)]
+        elif interpolation == 'linear':
+            (i0, i1, ti), (j0, j1, tj), (k0, k1, tk) = (
+                _linear_axis_weights(axis, values) for axis, values in zip((X, Y, Z), clamped))
+            corners = []
+            for i, wi in ((i0, 1. - ti), (i1, ti)):
+                for j, wj in ((j0, 1. - tj), (j1, tj)):
+                    for k, wk in ((k0, 1. - tk), (k1, tk)):
+                        corners.append((np.ravel_multi_index((j, i, k), shape), wi * wj * wk))
+        else:
+            raise ValueError("interpolation must be 'nearest' or 'linear', not {}".format(interpolation))
+
+        concs = np.zeros((points.shape[0], len(species_names)))
+        if from_file and not dict.__contains__(self.data, 'continuum_variables'):
+            # .mat column of each meshgrid voxel, read only the columns needed
+            mesh = self.data['mesh']
+            flat_idx = _get_voxel_index(mesh['voxels']['filename'], mesh['voxels']['centers'], X, Y, Z)
+            column_of = np.zeros(int(np.prod(shape)), dtype=np.intp)
+            column_of[flat_idx] = np.arange(flat_idx.shape[0])
+            columns = np.unique(np.concatenate([column_of[idx] for idx, _ in corners]))
+            values = self.get_substrate_rows(species_names, voxels=columns)
+            for idx, weight in corners:
+                concs += (weight * values[:, np.searchsorted(columns, column_of[idx])]).T
+            return concs
+
+        for si, species_name in enumerate(species_names):
+            flat_conc = self.get_concentrations(species_name).ravel()
+            for flat_idx, weight in corners:
+                concs[:, si] += weight * flat_conc[flat_idx]
+
+        return concs
+
+    def get_substrate_rows(self, species_names=None, volumes=False, voxels=None):
+        """
+        Reads only the rows of the requested chemical species from the
+        microenvironment .mat file, through a memory map and without building
+        the meshgrid arrays in data['continuum_variables']. Values are in the
+        voxel order of the .mat file, i.e. of get_linear_voxels().
+
+        Parameters
+        ----------
+        species_names : list (str), optional
+            Chemical species to read (default= all, in get_substrate_names()
+            order)
+        volumes : bool, optional
+            If True, the voxel volume row is returned as the first row
+        voxels : slice or array (int), optional
+            Voxels (columns of the .mat file) to read (default= all)
+
+        Returns
+        -------
+        rows : array (float) shape=[n_species (+1), n_voxels]
+            Concentrations of the requested species in each voxel, preceded
+            by the voxel volumes if volumes=True
+        """
+        sub_name_list = self.get_substrate_names()
+        if species_names is None:
+            species_names = sub_name_list
+
+        rows = [3] if volumes else []
+        for species_name in species_names:
+            if species_name not in sub_name_list:
+                raise KeyError('Substrate {} not in {}'.format(species_name, self._xml_file))
+            rows.append(4 + sub_name_list.index(species_name))
+
+        me_path, _ = self._get_data_files()
+        try:
+            return read_matlab4_rows(me_path, rows, voxels)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                "No such file or directory:\n'{}' referenced in '{}'".format(me_path, self._xml_file))
+
+    def get_substrate_summary(self, species_names=None, percentiles=()):
+        """
+        Reduces each chemical species over the whole domain, reading only the
+        needed rows of the microenvironment .mat file.
+
+        Parameters
+        ----------
+        species_names : list (str), optional
+            Chemical species to summarize (default= all)
+        percentiles : list (float), optional
+            Percentiles (0-100) to compute in addition to the fixed reductions
+
+        Returns
+        -------
+        summary_df : pd.DataFrame, shape=[n_species, 7 + n_percentiles]
+            One row per species with columns 'time', 'substrate', 'mean',
+            'sum', 'total' (volume-weighted total mass), 'min', 'max' and one
+            'p<q>' column per percentile
+        """
+        if species_names is None:
+            species_names = self.get_substrate_names()
+
+        rows = self.get_substrate_rows(species_names, volumes=True)
+        volumes, conc = rows[0], rows[1:]
+
+        summary = {'time': np.full(len(species_names), self.get_time()),
+                   'substrate': list(species_names),
+                   'mean': conc.mean(axis=1),
+                   'sum': conc.sum(axis=1),
+                   'total': conc @ volumes,
+                   'min': conc.min(axis=1),
+                   'max': conc.max(axis=1)}
+        if len(percentiles) > 0:
+            for q, values in zip(percentiles, np.percentile(conc, percentiles, axis=1)):
+                summary['p{:g}'.format(q)] = values
+
+        return pd.DataFrame(summary)
+
 
     ## CELL RELATED FUNCTIONS
 
     def get_cell_df(self):
         """
-        Builds DataFrame from data['discrete_cells']
+        Builds DataFrame from data['discrete_cells']. The DataFrame is built
+        once and returned again by later calls. Its numeric columns share
+        memory with data['discrete_cells'], so copy it before modifying it.
+
+        cell_type is decoded into a pd.Categorical of the cell type names in
+        the xml (if the xml lists them), current_phase into a pd.Categorical
+        of the PhysiCell phase names.
 
         Returns
         -------
         cells_df : pd.Dataframe, shape=[n_cells, n_variables]
             Dataframe containing the cell data for all cells at this time step
         """
-        cells_df = pd.DataFrame(self.data['discrete_cells'])
+        if self._cell_df is not None:
+            return self._cell_df
+
+        discrete_cells = self.data['discrete_cells']
+        if self._cell_matrix is not None:
+            # all variables are rows of one float64 matrix, its transpose is
+            # used as the single block of the DataFrame without a copy
+            cells_df = pd.DataFrame(self._cell_matrix.T, columns=list(discrete_cells),
+                                    copy=False)
+        else:
+            cells_df = pd.DataFrame(discrete_cells, copy=False)
+
+        cell_types = self.get_cell_types()
+        if 'cell_type' in cells_df and len(cell_types) > 0:
+            cells_df['cell_type'] = _decode_categorical(discrete_cells['cell_type'], cell_types)
+        if 'current_phase' in cells_df:
+            cells_df['current_phase'] = _decode_categorical(discrete_cells['current_phase'],
+                                                            _phase_names)
+
+        self._cell_df = cells_df
         return cells_df
+
+    def get_cell_types(self):
+        """
+        Returns the cell types listed in the xml, which PhysiCell writes since
+        version 1.14. Older outputs have no such list.
+
+        Returns
+        -------
+        cell_types : dict
+            Maps each cell_type code to the name of its cell definition, empty
+            if the xml does not list the cell types
+        """
+        return dict(self._schema['cell_types'])
     
     def get_cell_variables(self):
         """
@@ -299,207 +873,684 @@ class pyMCDS:
             cell dataframe containing only cells in the same voxel as the point 
             specified by x, y, and z.
         """
-        ds = self.get_mesh_spacing()
-        xx, yy, zz = self.get_mesh()
         i, j, k = self.get_containing_voxel_ijk(x, y, z)
-        x_vox = xx[j, i, k]
-        y_vox = yy[j, i, k]
-        z_vox = zz[j, i, k]
+        in_voxel = self.get_spatial_index().cells_in_voxels([[i, j, k]])[0]
 
         cell_df = self.get_cell_df()
-        inside_voxel = ( (cell_df['position_x'] < x_vox + ds/2.) &
-                         (cell_df['position_x'] > x_vox - ds/2.) &
-                         (cell_df['position_y'] < y_vox + ds/2.) &
-                         (cell_df['position_y'] > y_vox - ds/2.) &
-                         (cell_df['position_z'] < z_vox + ds/2.) &
-                         (cell_df['position_z'] > z_vox - ds/2.) )
-        vox_df = cell_df[inside_voxel]
+        vox_df = cell_df.iloc[in_voxel]
         return vox_df
 
-    def _read_xml(self, xml_file, output_path='.'):
+    def get_population_counts(self):
+        """
+        Counts the cells of each cell type, phase and live/dead state in a
+        single bincount over the cells.
+
+        Returns
+        -------
+        counts_df : pd.DataFrame, shape=[n_groups, 5]
+            One row per combination present, with columns 'time',
+            'cell_type' (name if the xml lists the cell types, code
+            otherwise), 'current_phase' (name), 'dead' and 'count'
+        """
+        discrete_cells = self.data['discrete_cells']
+        types, type_idx = _group_codes(discrete_cells['cell_type'])
+        phases, phase_idx = _group_codes(discrete_cells['current_phase'])
+        dead = self._get_dead()
+
+        shape = (types.shape[0], phases.shape[0], 2)
+        counts = np.bincount(np.ravel_multi_index((type_idx, phase_idx, dead), shape),
+                             minlength=int(np.prod(shape)))
+        found = np.flatnonzero(counts)
+        t, p, d = np.unravel_index(found, shape)
+
+        return pd.DataFrame({'time': np.full(found.shape[0], self.get_time()),
+                             'cell_type': self._get_type_names(types[t]),
+                             'current_phase': [_phase_names.get(code, '{:g}'.format(code))
+                                               for code in phases[p]],
+                             'dead': d.astype(bool),
+                             'count': counts[found]})
+
+    def get_cell_summary(self, variables, percentiles=(), dead=False):
+        """
+        Reduces cell variables per cell type. The sums, means and spreads of
+        all types come out of one bincount per variable, the minima, maxima
+        and percentiles out of one grouping of the cells by type.
+
+        Parameters
+        ----------
+        variables : list (str)
+            Cell variables to summarize, names as in data['discrete_cells']
+        percentiles : list (float), optional
+            Percentiles (0-100) to compute in addition to the fixed reductions
+        dead : bool, optional
+            If True, the live and dead cells of each type are summarized
+            separately (default= False)
+
+        Returns
+        -------
+        summary_df : pd.DataFrame, shape=[n_groups * n_variables, 9 + n_percentiles]
+            One row per cell type and variable with columns 'time',
+            'cell_type', 'dead' (only if dead is True), 'variable', 'count',
+            'mean', 'std' (population standard deviation), 'sum', 'min',
+            'max' and one 'p<q>' column per percentile
+        """
+        discrete_cells = self.data['discrete_cells']
+        for variable in variables:
+            if variable not in discrete_cells:
+                raise KeyError('Cell variable {} not in {}'.format(variable, self._xml_file))
+
+        types, group = _group_codes(discrete_cells['cell_type'])
+        n_groups = types.shape[0]
+        if dead:
+            group = group * 2 + self._get_dead()
+            n_groups *= 2
+        counts = np.bincount(group, minlength=n_groups)
+        found = np.flatnonzero(counts)
+
+        # cells sorted by group, the cells of group g are order[starts[g]:ends[g]]
+        order = np.argsort(group, kind='stable')
+        ends = np.cumsum(counts)
+        starts = ends - counts
+
+        summaries = []
+        for variable in variables:
+            values = np.asarray(discrete_cells[variable], dtype=float)
+            sums = np.bincount(group, weights=values, minlength=n_groups)
+            means = sums / np.maximum(counts, 1)
+            deviations = values - means[group]
+            stds = np.sqrt(np.bincount(group, weights=deviations**2, minlength=n_groups)
+                           / np.maximum(counts, 1))
+
+            grouped = values[order]
+            summary = {'time': np.full(found.shape[0], self.get_time()),
+                       'cell_type': self._get_type_names(types[found // 2 if dead else found])}
+            if dead:
+                summary['dead'] = (found % 2).astype(bool)
+            summary['variable'] = [variable] * found.shape[0]
+            summary['count'] = counts[found]
+            summary['mean'] = means[found]
+            summary['std'] = stds[found]
+            summary['sum'] = sums[found]
+            if found.shape[0] > 0:
+                summary['min'] = np.minimum.reduceat(grouped, starts[found])
+                summary['max'] = np.maximum.reduceat(grouped, starts[found])
+            else:
+                summary['min'] = summary['max'] = np.zeros(0)
+            if len(percentiles) > 0:
+                values_q = np.array([np.percentile(grouped[starts[g]:ends[g]], percentiles)
+                                     for g in found]).reshape(-1, len(percentiles))
+                for q, values in zip(percentiles, values_q.T):
+                    summary['p{:g}'.format(q)] = values
+            summaries.append(pd.DataFrame(summary))
+
+        if len(summaries) == 0:
+            columns = ['time', 'cell_type'] + (['dead'] if dead else []) + \
+                ['variable', 'count', 'mean', 'std', 'sum', 'min', 'max'] + \
+                ['p{:g}'.format(q) for q in percentiles]
+            return pd.DataFrame(columns=columns)
+        return pd.concat(summaries, ignore_index=True)
+
+    def get_radial_profile(self, bins=20, n_quantiles=20, center=None, dead=False):
+        """
+        Summarizes the distances of the cells from a center per cell type, as
+        a fixed-bin histogram and a quantile sketch. Both have the same width
+        for every time step and run, so they can be stored as plain columns
+        and compared directly, see pyMCDS_spatial.quantile_wasserstein and
+        pyMCDS_spatial.histogram_wasserstein.
+
+        Parameters
+        ----------
+        bins : int or array (float), optional
+            Number of equal bins between the center and the farthest corner
+            of the domain, or the bin edges themselves. Distances past the
+            last edge are counted in the last bin (default= 20)
+        n_quantiles : int, optional
+            Number of quantiles in the sketch, taken at the probability levels
+            (i + 0.5) / n_quantiles (default= 20)
+        center : array (float) shape=[3,], optional
+            Center the distances are measured from (default= the center of
+            the domain)
+        dead : bool, optional
+            If True, the live and dead cells of each type are summarized
+            separately (default= False)
+
+        Returns
+        -------
+        profile_df : pd.DataFrame, shape=[n_groups, 3 + n_bins + n_quantiles]
+            One row per cell type with columns 'time', 'cell_type', 'dead'
+            (only if dead is True), 'count', the bin counts 'bin_0' ...
+            and the quantiles 'q_0' .... The bin edges and quantile levels
+            are kept as lists in profile_df.attrs['bin_edges'] and
+            profile_df.attrs['quantile_levels']
+        """
+        bounds = np.array(self.data['mesh']['bounds'])
+        if center is None:
+            center = bounds.mean(axis=1)
+        center = np.asarray(center, dtype=float)
+        if np.ndim(bins) == 0:
+            r_max = np.linalg.norm(np.abs(bounds - center[:, np.newaxis]).max(axis=1))
+            edges = np.linspace(0., r_max, int(bins) + 1)
+        else:
+            edges = np.asarray(bins, dtype=float)
+        n_bins = edges.shape[0] - 1
+        levels = (np.arange(n_quantiles) + 0.5) / n_quantiles
+
+        discrete_cells = self.data['discrete_cells']
+        r = np.sqrt((np.asarray(discrete_cells['position_x']) - center[0])**2
+                    + (np.asarray(discrete_cells['position_y']) - center[1])**2
+                    + (np.asarray(discrete_cells['position_z']) - center[2])**2)
+
+        types, group = _group_codes(discrete_cells['cell_type'])
+        n_groups = types.shape[0]
+        if dead:
+            group = group * 2 + self._get_dead()
+            n_groups *= 2
+        counts = np.bincount(group, minlength=n_groups)
+        found = np.flatnonzero(counts)
+
+        # one bincount over (group, bin) gives every histogram at once
+        r_bin = np.clip(np.searchsorted(edges, r, side='right') - 1, 0, n_bins - 1)
+        histograms = np.bincount(group * n_bins + r_bin, minlength=n_groups * n_bins)
+        histograms = histograms.reshape(n_groups, n_bins)[found]
+
+        # distances sorted by group, then by value within each group
+        r_sorted = r[np.lexsort((r, group))]
+        starts = np.cumsum(counts) - counts
+        sketches = np.array([np.quantile(r_sorted[starts[g]:starts[g]+counts[g]], levels)
+                             for g in found]).reshape(-1, n_quantiles)
+
+        profile = {'time': np.full(found.shape[0], self.get_time()),
+                   'cell_type': self._get_type_names(types[found // 2 if dead else found])}
+        if dead:
+            profile['dead'] = (found % 2).astype(bool)
+        profile['count'] = counts[found]
+        for i in range(n_bins):
+            profile['bin_{}'.format(i)] = histograms[:, i]
+        for i in range(n_quantiles):
+            profile['q_{}'.format(i)] = sketches[:, i]
+
+        profile_df = pd.DataFrame(profile)
+        profile_df.attrs['bin_edges'] = edges.tolist()
+        profile_df.attrs['quantile_levels'] = levels.tolist()
+        return profile_df
+
+    def get_spatial_index(self):
+        """
+        Returns the spatial index of the cells of this time step. It is built
+        on first use and then reused by every query, see
+        pyMCDS_spatial.SpatialIndex for the batched voxel, radius and nearest
+        neighbour queries it supports.
+
+        Returns
+        -------
+        index : pyMCDS_spatial.SpatialIndex
+        """
+        if self._spatial_index is None:
+            from pyMCDS_spatial import SpatialIndex
+
+            cells = self.data['discrete_cells']
+            positions = np.column_stack((cells['position_x'], cells['position_y'],
+                                         cells['position_z']))
+            self._spatial_index = SpatialIndex(positions, *self._get_axes())
+        return self._spatial_index
+
+    def get_cell_density(self, cell_type=None, volume_fraction=False):
+        """
+        Returns the cells of a type binned onto the mesh, as a field of the
+        same shape as get_concentrations. All cells are assigned their voxel
+        in one pass (see get_spatial_index), and the count and volume fields
+        of every cell type are built with a single bincount the first time
+        any of them is requested. Cells outside of the mesh are left out.
+
+        Parameters
+        ----------
+        cell_type : str or int, optional
+            Cell type, by name or code (default= None, all cells)
+        volume_fraction : bool, optional
+            If True, returns the fraction of each voxel's volume taken up by
+            the cells (their total_volume) instead of their number
+            (default= False)
+
+        Returns
+        -------
+        density : array (float) shape=[ny_voxel, nx_voxel, nz_voxel]
+            Number of cells, or volume fraction, in each voxel
+        """
+        fields = self._get_cell_fields()
+        if volume_fraction:
+            if fields['volumes'] is None:
+                raise KeyError('Cell variable total_volume not in {}'.format(self._xml_file))
+            values = fields['volumes']
+        else:
+            values = fields['counts']
+
+        if cell_type is None:
+            density = values.sum(axis=0, dtype=float)
+        else:
+            found = np.flatnonzero(fields['types'] == self._get_type_code(cell_type))
+            if found.shape[0] == 0:
+                density = np.zeros(values.shape[1:])
+            else:
+                density = values[found[0]].astype(float)
+
+        if volume_fraction:
+            density /= fields['voxel_volumes']
+        return density
+
+    def _read_xml(self, xml_file, output_path='.', mesh=None, schema=None):
         """
-        Does the actual work of initializing MultiCellDS by parsing the xml
+        Does the actual work of initializing MultiCellDS by parsing the xml.
+        Only the metadata is read here, the mesh, microenvironment and cell
+        blocks are registered as loaders on the returned container. If the
+        schema of the run is given, only the fields that change between time
+        steps are parsed.
         """
 
         output_path = Path(output_path)
         xml_file = output_path / xml_file
-        tree = ET.parse(xml_file)
+        data = self._read_xml_bytes(xml_file)
+        if schema is None:
+            root = ET.fromstring(data)
+            schema = _parse_schema(root)
+        else:
+            root = ET.fromstring(_strip_schema_blocks(data))
+        fields = _get_frame_fields(root)
 
         print('Reading {}'.format(xml_file))
 
-        root = tree.getroot()
-        MCDS = {}
-
-        # Get current simulated time
-        metadata_node = root.find('metadata')
-        time_node = metadata_node.find('current_time')
-        MCDS['metadata'] = {}
-        MCDS['metadata']['current_time'] = float(time_node.text)
-        MCDS['metadata']['time_units'] = time_node.get('units')
-
-        # Get current runtime
-        time_node = metadata_node.find('current_runtime')
-        MCDS['metadata']['current_runtime'] = float(time_node.text)
-        MCDS['metadata']['runtime_units'] = time_node.get('units')
+        MCDS = _LazyMCDS()
 
-        # find the microenvironment node
-        me_node = root.find('microenvironment')
-        me_node = me_node.find('domain')
+        self._output_path = output_path
+        self._xml_file = xml_file
+        self._schema = schema
+        self._fields = fields
 
-        # find the mesh node
-        mesh_node = me_node.find('mesh')
-        MCDS['metadata']['spatial_units'] = mesh_node.get('units')
-        MCDS['mesh'] = {}
+        # Get current simulated time and runtime
+        MCDS['metadata'] = {}
+        MCDS['metadata']['current_time'] = fields['current_time']
+        MCDS['metadata']['time_units'] = fields['time_units']
+        MCDS['metadata']['current_runtime'] = fields['current_runtime']
+        MCDS['metadata']['runtime_units'] = fields['runtime_units']
+        MCDS['metadata']['spatial_units'] = schema['spatial_units']
+
+        if mesh is not None:
+            MCDS['mesh'] = mesh
+        else:
+            MCDS.add_loader('mesh', self._read_mesh)
+        if self._microenv:
+            MCDS.add_loader('continuum_variables', self._read_microenvironment)
+        if self._cells:
+            MCDS.add_loader('discrete_cells', self._read_cells)
 
-        # while we're at it, find the mesh
-        coord_str = mesh_node.find('x_coordinates').text
-        delimiter = mesh_node.find('x_coordinates').get('delimiter')
-        x_coords = np.array(coord_str.split(delimiter), dtype=np.float)
+        return MCDS
 
-        coord_str = mesh_node.find('y_coordinates').text
-        delimiter = mesh_node.find('y_coordinates').get('delimiter')
-        y_coords = np.array(coord_str.split(delimiter), dtype=np.float)
+    def _read_mesh(self):
+        """
+        Builds the mesh from the coordinates in the xml and the voxels from
+        the mesh .mat file referenced therein.
+        """
+        output_path = self._output_path
 
-        coord_str = mesh_node.find('z_coordinates').text
-        delimiter = mesh_node.find('z_coordinates').get('delimiter')
-        z_coords = np.array(coord_str.split(delimiter), dtype=np.float)
+        mesh = _Mesh()
+        x_coords = self._schema['x_coordinates']
+        y_coords = self._schema['y_coordinates']
+        z_coords = self._schema['z_coordinates']
 
-        # reshape into a mesh grid
-        xx, yy, zz = np.meshgrid(x_coords, y_coords, z_coords)
+        # keep only the axes, the meshgrids are broadcast from them on access
+        mesh['x_axis'] = x_coords
+        mesh['y_axis'] = y_coords
+        mesh['z_axis'] = z_coords
 
-        MCDS['mesh']['x_coordinates'] = xx
-        MCDS['mesh']['y_coordinates'] = yy
-        MCDS['mesh']['z_coordinates'] = zz
+        # distance between voxel centers along each axis, 0 for a single voxel
+        mesh['spacing'] = [float(axis[-1] - axis[0]) / (axis.shape[0] - 1) if axis.shape[0] > 1 else 0.
+                           for axis in (x_coords, y_coords, z_coords)]
+        # [min, max] of the domain along each axis, voxel edges not centers
+        mesh['bounds'] = [[float(axis[0] - ds / 2.), float(axis[-1] + ds / 2.)]
+                          for axis, ds in zip((x_coords, y_coords, z_coords), mesh['spacing'])]
 
         # Voxel data must be loaded from .mat file
-        voxel_file = mesh_node.find('voxels').find('filename').text
-        voxel_path = output_path / voxel_file
-        try:
-            initial_mesh = sio.loadmat(voxel_path)['mesh']
-        except:
-            raise FileNotFoundError(
-                "No such file or directory:\n'{}' referenced in '{}'".format(voxel_path, xml_file))
-            sys.exit(1)
-
-        print('Reading {}'.format(voxel_path))
+        voxel_path = output_path / self._schema['voxel_file']
+        initial_mesh = self._read_voxels_file(voxel_path)
 
         # center of voxel specified by first three rows [ x, y, z ]
         # volume specified by fourth row
-        MCDS['mesh']['voxels'] = {}
-        MCDS['mesh']['voxels']['centers'] = initial_mesh[:3, :]
-        MCDS['mesh']['voxels']['volumes'] = initial_mesh[3, :]
+        mesh['voxels'] = {}
+        mesh['voxels']['centers'] = initial_mesh[:3, :]
+        mesh['voxels']['volumes'] = initial_mesh[3, :]
+        mesh['voxels']['filename'] = voxel_path
+
+        return mesh
+
+    def _read_microenvironment(self):
+        """
+        Reads the chemical species and their concentrations from the
+        microenvironment .mat file referenced in the xml.
+        """
+        mesh = self.data['mesh']
 
         # Continuum_variables, unlike in the matlab version the individual chemical
         # species will be primarily accessed through their names e.g.
         # MCDS['continuum_variables']['oxygen']['units']
         # MCDS['continuum_variables']['glucose']['data']
-        MCDS['continuum_variables'] = {}
-        variables_node = me_node.find('variables')
-        file_node = me_node.find('data').find('filename')
+        continuum_variables = {}
+        me_path, _ = self._get_data_files()
+        n_species = len(self._schema['variables'])
+
+        # each species' 'data' is a view into one [n_species, ny, nx, nz] block
+        if self._cache_dir is None:
+            conc_data = self._read_me_file(me_path, mesh, n_species, self._dtype or float)
+        else:
+            # the cache always holds float64, so that any dtype can be served
+            conc_data = self._read_cached(me_path, self._read_me_file, me_path, mesh, n_species)
+            if self._dtype is not None:
+                conc_data = conc_data.astype(self._dtype, copy=False)
+
+        for si, variable in enumerate(self._schema['variables']):
+            species_name = variable['name']
+            continuum_variables[species_name] = {}
+            continuum_variables[species_name]['units'] = variable['units']
+
+            print('Parsing {:s} data'.format(species_name))
+
+            # concentration data, already laid out as a meshgrid
+            continuum_variables[species_name]['data'] = conc_data[si]
+
+            # diffusion and decay data for each species
+            continuum_variables[species_name]['diffusion_coefficient'] \
+                = dict(variable['diffusion_coefficient'])
+            continuum_variables[species_name]['decay_rate'] = dict(variable['decay_rate'])
 
+        return continuum_variables
+
+    def _read_cells(self):
+        """
+        Reads the cell labels from the xml and the cell data from the cells
+        .mat file referenced therein.
+        """
+        discrete_cells = {}
+        data_labels = self._schema['data_labels']
+
+        # rows of the cells matrix to keep, all of them unless a projection
+        # was requested
+        if self._cell_variables is None:
+            rows = list(range(len(data_labels)))
+        else:
+            rows = self._resolve_cell_variables(data_labels)
+
+        # load the file
+        _, cell_path = self._get_data_files()
+        if self._memmap:
+            # the whole file is mapped, each variable is a view of its row
+            cell_data = self._read_cells_file(cell_path, memmap=True)
+            data_rows = rows
+        elif self._cache_dir is None:
+            cell_data = self._read_cells_file(cell_path, rows)
+            data_rows = range(len(rows))
+        else:
+            # the cache always holds the full matrix, so that any projection
+            # can be served from it later
+            cell_data = self._read_cached(cell_path, self._read_cells_file, cell_path)[rows, :]
+            data_rows = range(len(rows))
+
+        if self._dtype is None and list(data_rows) == list(range(cell_data.shape[0])) \
+                and len(set(rows)) == len(rows):
+            # every row of cell_data is one variable, in the order of
+            # discrete_cells, kept for get_cell_df
+            self._cell_matrix = cell_data
+
+        for data_row, row in zip(data_rows, rows):
+            values = cell_data[data_row, :]
+            if self._dtype is not None:
+                compact = None
+                if data_labels[row] in _integer_cell_variables:
+                    compact = _compact_integer(values)
+                values = compact if compact is not None else values.astype(self._dtype)
+            discrete_cells[data_labels[row]] = values
+
+        return discrete_cells
+
+    def _get_dead(self):
+        """
+        Returns 1 for dead cells and 0 for live ones, from the 'dead'
+        variable or, in outputs without one, from the phase of the cells
+        """
+        discrete_cells = self.data['discrete_cells']
+        if 'dead' in discrete_cells:
+            return (np.asarray(discrete_cells['dead']) != 0).astype(np.intp)
+        return np.isin(discrete_cells['current_phase'], _dead_phases).astype(np.intp)
+
+    def _get_type_code(self, cell_type):
+        """
+        Returns the code of a cell type given by name or code
+        """
+        if isinstance(cell_type, str):
+            codes = {name: code for code, name in self.get_cell_types().items()}
+            if cell_type not in codes:
+                raise KeyError('Cell type {} not in {}'.format(cell_type, self._xml_file))
+            return codes[cell_type]
+        return cell_type
+
+    def _get_cell_fields(self):
+        """
+        Bins the cells onto the mesh once: the number and total volume of
+        the cells of each type in each voxel, and the voxel volumes
+        """
+        if self._cell_fields is None:
+            index = self.get_spatial_index()
+            cells = self.data['discrete_cells']
+            types, type_idx = _group_codes(cells['cell_type'])
+            n_voxels = int(np.prod(index.shape))
+            shape = (types.shape[0],) + index.shape
+
+            inside = index.voxel_of_cell >= 0
+            # one flat (type, voxel) index for all cells
+            key = type_idx[inside] * n_voxels + index.voxel_of_cell[inside]
+            counts = np.bincount(key, minlength=types.shape[0] * n_voxels).reshape(shape)
+            volumes = None
+            if 'total_volume' in cells:
+                volumes = np.bincount(key, weights=np.asarray(cells['total_volume'])[inside],
+                                      minlength=types.shape[0] * n_voxels).reshape(shape)
+
+            mesh = self.data['mesh']
+            voxel_volumes = np.zeros(index.shape)
+            flat_idx = _get_voxel_index(mesh['voxels']['filename'], mesh['voxels']['centers'],
+                                        *self._get_axes())
+            voxel_volumes.reshape(-1)[flat_idx] = mesh['voxels']['volumes']
+
+            self._cell_fields = {'types': types, 'counts': counts, 'volumes': volumes,
+                                 'voxel_volumes': voxel_volumes}
+        return self._cell_fields
+
+    def _get_type_names(self, codes):
+        """
+        Returns the names of the given cell type codes, or the codes
+        themselves if the xml does not list the cell types
+        """
+        cell_types = self.get_cell_types()
+        if len(cell_types) == 0:
+            return codes
+        return [cell_types.get(code, '{:g}'.format(code)) for code in codes]
+
+    def _get_data_files(self):
+        """
+        Returns the paths of the microenvironment and cells .mat files
+        referenced in the xml
+        """
+        me_file = self._fields.get('microenvironment_file')
+        cell_file = self._fields.get('cells_file')
+        return (None if me_file is None else self._output_path / me_file,
+                None if cell_file is None else self._output_path / cell_file)
+
+    def _resolve_cell_variables(self, data_labels):
+        """
+        Maps the requested cell variables onto rows of the cells matrix. Both
+        the names in data['discrete_cells'] (e.g. 'position_x') and the names
+        in the xml <labels> block (e.g. 'position', all three rows) are
+        accepted.
+        """
+        rows = []
+        for name in self._cell_variables:
+            name = name.replace(' ', '_')
+            if name in data_labels:
+                matches = [data_labels.index(name)]
+            else:
+                matches = [row for row, label in enumerate(data_labels)
+                           if label in (name + '_x', name + '_y', name + '_z')]
+            if len(matches) == 0:
+                raise KeyError('Cell variable {} not in the <labels> of {}'.format(name, self._xml_file))
+            rows.extend(row for row in matches if row not in rows)
+        return rows
+
+    def _read_me_file(self, me_path, mesh, n_species, dtype=float):
+        """
+        Reads the microenvironment .mat file and scatters its species rows
+        into meshgrid-shaped arrays, returned as one [n_species, ny, nx, nz]
+        block of the given dtype.
+        """
+        species_data = self._read_species_rows(me_path, n_species)
+
+        X, Y, Z = mesh['x_axis'], mesh['y_axis'], mesh['z_axis']
+        flat_idx = _get_voxel_index(mesh['voxels']['filename'], mesh['voxels']['centers'], X, Y, Z)
+
+        # scatter every species into its meshgrid position in a single pass
+        conc_data = np.zeros((n_species, Y.shape[0], X.shape[0], Z.shape[0]), dtype=dtype)
+        conc_data.reshape(n_species, -1)[:, flat_idx] = species_data
+        return conc_data
+
+    def _read_xml_bytes(self, xml_file):
+        """
+        Returns the contents of the xml file
+        """
+        with open(xml_file, 'rb') as f:
+            return f.read()
+
+    def _read_voxels_file(self, voxel_path):
+        """
+        Reads the [4, n_voxels] matrix of voxel centers and volumes from the
+        mesh .mat file
+        """
+        try:
+            if self._memmap:
+                initial_mesh = memmap_matlab4(voxel_path)
+            else:
+                initial_mesh = sio.loadmat(voxel_path)['mesh']
+        except:
+            raise FileNotFoundError(
+                "No such file or directory:\n'{}' referenced in '{}'".format(voxel_path, self._xml_file))
+            sys.exit(1)
+
+        print('Reading {}'.format(voxel_path))
+        return initial_mesh
+
+    def _read_species_rows(self, me_path, n_species):
+        """
+        Reads the [n_species, n_voxels] concentrations from the
+        microenvironment .mat file, in the voxel order of the file
+        """
         # micro environment data is shape [4+n, len(voxels)] where n is the number
         # of species being tracked. the first 3 rows represent (x, y, z) of voxel
         # centers. The fourth row contains the voxel volume. The 5th row and up will
         # contain values for that species in that voxel.
-        me_file = file_node.text
-        me_path = output_path / me_file
-        # Changes here
         try:
             me_data = sio.loadmat(me_path)['multiscale_microenvironment']
         except:
             raise FileNotFoundError(
-                "No such file or directory:\n'{}' referenced in '{}'".format(me_path, xml_file))
+                "No such file or directory:\n'{}' referenced in '{}'".format(me_path, self._xml_file))
             sys.exit(1)
 
         print('Reading {}'.format(me_path))
+        return me_data[4:4+n_species, :]
 
-        var_children = variables_node.findall('variable')
-
-        # we're going to need the linear x, y, and z coordinates later
-        # but we dont need to get them in the loop
-        X, Y, Z = np.unique(xx), np.unique(yy), np.unique(zz)
-
-        for si, species in enumerate(var_children):
-            species_name = species.get('name')
-            MCDS['continuum_variables'][species_name] = {}
-            MCDS['continuum_variables'][species_name]['units'] = species.get(
-                'units')
-
-            print('Parsing {:s} data'.format(species_name))
+    def _read_me_slab(self, species_names, k):
+        """
+        Reads the concentrations in the k-th z plane of the given species from
+        the microenvironment .mat file, returned as one [n_species, ny, nx]
+        block. BioFVM stores each z plane as one contiguous block of voxels,
+        so only 1/nz of the file is read.
+        """
+        mesh = self.data['mesh']
+        X, Y, Z = self._get_axes()
+        flat_idx = _get_voxel_index(mesh['voxels']['filename'], mesh['voxels']['centers'], X, Y, Z)
 
-            # initialize array for concentration data
-            MCDS['continuum_variables'][species_name]['data'] = np.zeros(xx.shape)
-
-            # travel down one level on tree
-            species = species.find('physical_parameter_set')
-
-            # diffusion data for each species
-            MCDS['continuum_variables'][species_name]['diffusion_coefficient'] = {}
-            MCDS['continuum_variables'][species_name]['diffusion_coefficient']['value'] \
-                = float(species.find('diffusion_coefficient').text)
-            MCDS['continuum_variables'][species_name]['diffusion_coefficient']['units'] \
-                = species.find('diffusion_coefficient').get('units')
-
-            # decay data for each species
-            MCDS['continuum_variables'][species_name]['decay_rate'] = {}
-            MCDS['continuum_variables'][species_name]['decay_rate']['value'] \
-                = float(species.find('decay_rate').text)
-            MCDS['continuum_variables'][species_name]['decay_rate']['units'] \
-                = species.find('decay_rate').get('units')
-
-            # store data from microenvironment file as numpy array            
-            # iterate over each voxel
-            for vox_idx in range(MCDS['mesh']['voxels']['centers'].shape[1]):
-                # find the center
-                center = MCDS['mesh']['voxels']['centers'][:, vox_idx]
-
-                i = np.where(np.abs(center[0] - X) < 1e-10)[0][0]
-                j = np.where(np.abs(center[1] - Y) < 1e-10)[0][0]
-                k = np.where(np.abs(center[2] - Z) < 1e-10)[0][0]
-
-                MCDS['continuum_variables'][species_name]['data'][j, i, k] \
-                    = me_data[4+si, vox_idx]
-
-        # in order to get to the good stuff we have to pass through a few different
-        # hierarchal levels
-        cell_node = root.find('cellular_information')
-        cell_node = cell_node.find('cell_populations')
-        cell_node = cell_node.find('cell_population')
-        cell_node = cell_node.find('custom')
-        # we want the PhysiCell data, there is more of it
-        for child in cell_node.findall('simplified_data'):
-            if child.get('source') == 'PhysiCell':
-                cell_node = child
-                break
+        # .mat columns of the voxels in plane k, and their [j, i] position
+        columns = np.flatnonzero(flat_idx % Z.shape[0] == k)
+        block = slice(columns[0], columns[-1] + 1)
+        slab_data = self.get_substrate_rows(species_names, voxels=block)[:, columns - columns[0]]
 
-        MCDS['discrete_cells'] = {}
-        data_labels = []
-        # iterate over 'label's which are children of 'labels' these will be used to
-        # label data arrays
-        for label in cell_node.find('labels').findall('label'):
-            # I don't like spaces in my dictionary keys
-            fixed_label = label.text.replace(' ', '_')
-            if int(label.get('size')) > 1:
-                # tags to differentiate repeated labels (usually space related)
-                dir_label = ['_x', '_y', '_z']
-                for i in range(int(label.get('size'))):
-                    data_labels.append(fixed_label + dir_label[i])
-            else:
-                data_labels.append(fixed_label)
+        slab = np.zeros((len(species_names), Y.shape[0], X.shape[0]))
+        slab.reshape(len(species_names), -1)[:, flat_idx[columns] // Z.shape[0]] = slab_data
+        return slab
 
-        # load the file
-        cell_file = cell_node.find('filename').text
-        cell_path = output_path / cell_file
+    def _read_cells_file(self, cell_path, rows=None, memmap=False):
+        """
+        Reads the [n_labels, n_cells] matrix from the cells .mat file, or only
+        the given rows of it, through a memory map of the file. If memmap is
+        True, the read-only memory map of the whole matrix is returned as is.
+        """
         try:
-            cell_data = sio.loadmat(cell_path)['cells']
-        except:
+            if memmap:
+                cell_data = memmap_matlab4(cell_path)
+            else:
+                cell_data = read_matlab4_rows(cell_path, rows)
+        except FileNotFoundError:
             raise FileNotFoundError(
-                "No such file or directory:\n'{}' referenced in '{}'".format(cell_path, xml_file))
+                "No such file or directory:\n'{}' referenced in '{}'".format(cell_path, self._xml_file))
             sys.exit(1)
 
         print('Reading {}'.format(cell_path))
+        return cell_data
 
-        for col in range(len(data_labels)):
-            MCDS['discrete_cells'][data_labels[col]] = cell_data[col, :]
+    def _read_cached(self, source_path, reader, *args):
+        """
+        Returns reader(*args), going through the sidecar cache if it is
+        enabled. Cache files are .npy arrays named after the source file, its
+        size and its modification time, so a rewritten source file is never
+        served from a stale cache. Arrays read from the cache are memory-mapped
+        copy-on-write.
+        """
+        if self._cache_dir is None:
+            return reader(*args)
 
-        return MCDS
+        try:
+            stat = source_path.stat()
+        except FileNotFoundError:
+            return reader(*args)
+
+        cache_stem = source_path.stem
+        cache_path = self._cache_dir / '{}-{}-{}.npy'.format(cache_stem, stat.st_size, stat.st_mtime_ns)
+        if cache_path.is_file():
+            try:
+                data = np.load(cache_path, mmap_mode='c')
+                print('Reading {}'.format(cache_path))
+                return data
+            except FileNotFoundError:
+                # removed by another writer since, read the source instead
+                pass
+
+        data = reader(*args)
+
+        # write to a uniquely named file next to the final name first, so that
+        # concurrent readers never see a partially written cache file and
+        # concurrent writers (threads or processes) never share one
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix='.tmp', prefix=cache_path.name + '.',
+                                        dir=self._cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp_name, cache_path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+        # other writers may be filling or cleaning the same cache, entries
+        # they already removed or replaced are skipped
+        for stale_path in self._cache_dir.glob(cache_stem + '-*.npy'):
+            if stale_path == cache_path:
+                continue
+            try:
+                stale_path.unlink()
+            except OSError:
+                pass
+
+        return data
@@ -0,0 +1,171 @@
+#
+# pyMCDS_manifest.py - index the time steps of a PhysiCell output directory
+#
+# Usage:
+#  python pyMCDS_manifest.py [output_dir]
+#
+# Writes (or updates) .pyMCDS_manifest.json in output_dir and prints it as a
+# table. The manifest records for every outputNNNNNNNN.xml the simulated time
+# and runtime, the files it references, its number of cells and its
+# substrates, so that tools can look these up without parsing every xml.
+# Only time steps that are new or changed since the last run are parsed.
+#
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from matlab4 import read_matlab4_header
+from pyMCDS import pyMCDS
+
+manifest_name = '.pyMCDS_manifest.json'
+_manifest_format = 'pyMCDS_manifest'
+_manifest_version = 1
+
+
+def _index_frame(output_path, xml_file, schema=None):
+    """
+    Returns the manifest entry of one time step
+    """
+    mcds = pyMCDS(xml_file, output_path, microenv=False, cells=False, schema=schema)
+    me_path, cell_path = mcds._get_data_files()
+    stat = (Path(output_path) / xml_file).stat()
+
+    # a time step may reference no microenvironment or no cells file
+    n_cells = None
+    if cell_path is not None:
+        try:
+            n_cells = read_matlab4_header(cell_path)['cols']
+        except (FileNotFoundError, ValueError):
+            pass
+
+    metadata = mcds.data['metadata']
+    return {'xml_file': xml_file,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'current_time': metadata['current_time'],
+            'time_units': metadata['time_units'],
+            'current_runtime': metadata['current_runtime'],
+            'runtime_units': metadata['runtime_units'],
+            'mesh_file': mcds._schema['voxel_file'],
+            'microenvironment_file': None if me_path is None else me_path.name,
+            'cells_file': None if cell_path is None else cell_path.name,
+            'n_cells': n_cells,
+            'substrates': mcds.get_substrate_names()}
+
+
+def read_manifest(output_path='.'):
+    """
+    Returns the entries of the manifest of an output directory as they are
+    on disk, without checking them against the xml files
+
+    Parameters
+    ----------
+    output_path : str, optional
+        Path to the directory where the PhysiCell output files are stored
+
+    Returns
+    -------
+    frames : list (dict)
+        One entry per time step in output order, empty if there is no
+        manifest
+    """
+    manifest_path = Path(output_path) / manifest_name
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+    if manifest.get('format') != _manifest_format or manifest.get('version') != _manifest_version:
+        return []
+    return manifest['frames']
+
+
+def update_manifest(output_path='.', n_workers=None, processes=True):
+    """
+    Brings the manifest of an output directory up to date and returns it.
+    Time steps whose xml has the same size and modification time as in the
+    manifest are kept as they are, new or changed ones are parsed in
+    parallel, and time steps whose xml is gone are dropped. If the directory
+    is not writable, the manifest is only returned.
+
+    Parameters
+    ----------
+    output_path : str, optional
+        Path to the directory where the PhysiCell output files are stored
+    n_workers : int, optional
+        Number of workers in the pool (default= os.cpu_count())
+    processes : bool, optional
+        If True use a process pool, otherwise a thread pool (default= True)
+
+    Returns
+    -------
+    frames : list (dict)
+        One entry per time step in output order, with the keys xml_file,
+        size, mtime_ns, current_time, time_units, current_runtime,
+        runtime_units, mesh_file, microenvironment_file and cells_file (None
+        if the xml references no such file), n_cells (None if the cells file
+        is missing) and substrates
+    """
+    output_path = Path(output_path)
+    xml_files = sorted(f.name for f in output_path.glob('output*.xml'))
+    known = {entry['xml_file']: entry for entry in read_manifest(output_path)}
+
+    frames = {}
+    stale = []
+    for xml_file in xml_files:
+        entry = known.get(xml_file)
+        stat = (output_path / xml_file).stat()
+        if entry is not None and entry['size'] == stat.st_size \
+                and entry['mtime_ns'] == stat.st_mtime_ns:
+            frames[xml_file] = entry
+        else:
+            stale.append(xml_file)
+
+    if len(stale) > 0:
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        # the labels, species and mesh are parsed once, the other time steps
+        # only scan their xml for their times and file names
+        schema = pyMCDS(stale[0], output_path, microenv=False, cells=False)._schema
+        pool = ProcessPoolExecutor if processes and len(stale) > 1 else ThreadPoolExecutor
+        with pool(max_workers=n_workers) as executor:
+            entries = executor.map(_index_frame, [output_path] * len(stale), stale,
+                                   [schema] * len(stale),
+                                   chunksize=max(1, len(stale) // (4 * n_workers)))
+            frames.update((entry['xml_file'], entry) for entry in entries)
+
+    frames = [frames[xml_file] for xml_file in xml_files]
+    if len(stale) > 0 or len(known) != len(frames):
+        manifest = {'format': _manifest_format, 'version': _manifest_version, 'frames': frames}
+        manifest_path = output_path / manifest_name
+        tmp_path = manifest_path.with_name(manifest_path.name + '.{}.tmp'.format(os.getpid()))
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp_path, manifest_path)
+        except OSError:
+            pass
+
+    return frames
+
+
+def get_manifest_df(output_path='.', n_workers=None, processes=True):
+    """
+    Returns the up to date manifest of an output directory as a DataFrame,
+    see update_manifest
+
+    Returns
+    -------
+    manifest_df : pd.DataFrame, shape=[n_time_steps, 12]
+    """
+    return pd.DataFrame(update_manifest(output_path, n_workers, processes))
+
+
+if __name__ == '__main__':
+    output_path = sys.argv[1] if len(sys.argv) > 1 else '.'
+    manifest_df = get_manifest_df(output_path)
+    print(manifest_df[['xml_file', 'current_time', 'current_runtime', 'n_cells']].to_string(index=False))
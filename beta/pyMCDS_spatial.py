@@ -0,0 +1,502 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from pyMCDS import _nearest_axis_index, pyMCDS
+
+
+class SpatialIndex:
+    """
+    This class indexes the cells of a single time step by position, so that
+    batches of spatial queries can be answered without scanning every cell.
+    Cells are binned into the voxels of the BioFVM mesh (stored CSR-style:
+    cell indices sorted by voxel plus per-voxel offsets), and a KD-tree is
+    built on first use for radius and nearest neighbour queries.
+
+    Cell indices returned by the queries are positions in the arrays of
+    data['discrete_cells'] (and rows of get_cell_df()).
+
+    Parameters
+    ----------
+    positions : array (float) shape=[n_cells, 3]
+        x, y and z positions of the cells
+    X, Y, Z : array (float)
+        Sorted voxel center coordinates along each axis of the mesh
+
+    Attributes
+    ----------
+    voxel_of_cell : array (int) shape=[n_cells,]
+        Flat index of the voxel containing each cell into the
+        [ny_voxel, nx_voxel, nz_voxel] meshgrid, -1 for cells outside the mesh
+    """
+    def __init__(self, positions, X, Y, Z):
+        self.positions = np.ascontiguousarray(positions, dtype=float)
+        self.shape = (Y.shape[0], X.shape[0], Z.shape[0])
+        self._tree = None
+
+        i = _nearest_axis_index(X, self.positions[:, 0])
+        j = _nearest_axis_index(Y, self.positions[:, 1])
+        k = _nearest_axis_index(Z, self.positions[:, 2])
+
+        inside = np.ones(self.positions.shape[0], dtype=bool)
+        for axis, values in ((X, self.positions[:, 0]), (Y, self.positions[:, 1]),
+                             (Z, self.positions[:, 2])):
+            # a single voxel along an axis (2D runs) holds every cell
+            if axis.shape[0] > 1:
+                half = (axis[-1] - axis[0]) / (axis.shape[0] - 1) / 2.
+                inside &= (values >= axis[0] - half) & (values <= axis[-1] + half)
+
+        self.voxel_of_cell = np.ravel_multi_index((j, i, k), self.shape)
+        self.voxel_of_cell[~inside] = -1
+
+        # CSR buckets: cells sorted by voxel, cells of voxel v are
+        # cell_order[voxel_ptr[v]:voxel_ptr[v+1]]
+        binned = np.flatnonzero(inside)
+        order = np.argsort(self.voxel_of_cell[binned], kind='stable')
+        self.cell_order = binned[order]
+        counts = np.bincount(self.voxel_of_cell[binned], minlength=int(np.prod(self.shape)))
+        self.voxel_ptr = np.concatenate(([0], np.cumsum(counts)))
+
+    @property
+    def tree(self):
+        """
+        KD-tree over the cell positions, built on first access
+        """
+        if self._tree is None:
+            self._tree = cKDTree(self.positions)
+        return self._tree
+
+    def cells_in_voxels(self, ijk):
+        """
+        Returns the cells contained in each of the given voxels
+
+        Parameters
+        ----------
+        ijk : array (int) shape=[n_voxels, 3]
+            i, j and k index of each voxel, as returned by
+            pyMCDS.get_containing_voxel_ijk
+
+        Returns
+        -------
+        cells : list (array (int)), length=n_voxels
+            Indices of the cells in each voxel, in ascending order
+        """
+        ijk = np.asarray(ijk, dtype=np.intp).reshape(-1, 3)
+        if ijk.shape[0] == 0:
+            return []
+        voxels = np.ravel_multi_index((ijk[:, 1], ijk[:, 0], ijk[:, 2]), self.shape)
+
+        starts = self.voxel_ptr[voxels]
+        lengths = self.voxel_ptr[voxels + 1] - starts
+        ends = np.cumsum(lengths)
+
+        # gather all buckets at once, then split them per voxel
+        gather = np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)
+        return np.split(self.cell_order[gather], ends[:-1])
+
+    def cells_within(self, points, r):
+        """
+        Returns the cells within distance r of each of the given points
+
+        Parameters
+        ----------
+        points : array (float) shape=[n_points, 3]
+            x, y and z positions of the query points
+        r : float or array (float) shape=[n_points,]
+            Search radius, in the spatial units of the mesh
+
+        Returns
+        -------
+        cells : list (array (int)), length=n_points
+            Indices of the cells within r of each point, in ascending order
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        found = self.tree.query_ball_point(points, r, return_sorted=True)
+        return [np.asarray(cells, dtype=np.intp) for cells in found]
+
+    def nearest_cells(self, points, k=1):
+        """
+        Returns the k nearest cells to each of the given points
+
+        Parameters
+        ----------
+        points : array (float) shape=[n_points, 3]
+            x, y and z positions of the query points
+        k : int
+            Number of neighbours to return
+
+        Returns
+        -------
+        distances : array (float) shape=[n_points, k]
+            Distance to each neighbour, inf where there are fewer than k cells
+        cells : array (int) shape=[n_points, k]
+            Index of each neighbour, n_cells where there are fewer than k cells
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        distances, cells = self.tree.query(points, k=k)
+        return distances.reshape(points.shape[0], k), cells.reshape(points.shape[0], k)
+
+
+def quantile_wasserstein(quantiles_a, quantiles_b):
+    """
+    Returns the 1-Wasserstein distance between distributions given by their
+    quantiles at the same equally spaced probability levels, e.g. the q_
+    columns of pyMCDS.get_radial_profile. Rows are compared pairwise.
+
+    Parameters
+    ----------
+    quantiles_a, quantiles_b : array (float) shape=[..., n_quantiles]
+        Quantile sketches of the two distributions
+
+    Returns
+    -------
+    distance : float or array (float) shape=[...]
+    """
+    quantiles_a = np.asarray(quantiles_a, dtype=float)
+    quantiles_b = np.asarray(quantiles_b, dtype=float)
+    return np.abs(quantiles_a - quantiles_b).mean(axis=-1)
+
+
+def histogram_wasserstein(counts_a, counts_b, edges):
+    """
+    Returns the 1-Wasserstein distance between distributions given by their
+    counts on the same bins, e.g. the bin_ columns of
+    pyMCDS.get_radial_profile, with the mass spread evenly within each bin.
+    Rows are compared pairwise.
+
+    Parameters
+    ----------
+    counts_a, counts_b : array (float) shape=[..., n_bins]
+        Histograms of the two distributions
+    edges : array (float) shape=[n_bins + 1,]
+        Bin edges
+
+    Returns
+    -------
+    distance : float or array (float) shape=[...]
+    """
+    counts_a = np.asarray(counts_a, dtype=float)
+    counts_b = np.asarray(counts_b, dtype=float)
+    cdf_a = np.cumsum(counts_a, axis=-1) / counts_a.sum(axis=-1, keepdims=True)
+    cdf_b = np.cumsum(counts_b, axis=-1) / counts_b.sum(axis=-1, keepdims=True)
+    # the difference of the cdfs is linear within each bin, integrate its
+    # absolute value exactly, also in bins where the two cdfs cross
+    upper = cdf_a - cdf_b
+    lower = np.concatenate((np.zeros(upper.shape[:-1] + (1,)), upper[..., :-1]), axis=-1)
+    total = np.abs(lower) + np.abs(upper)
+    crossing = lower * upper < 0
+    area = np.where(crossing, (lower**2 + upper**2) / np.where(crossing, 2. * total, 1.),
+                    total / 2.)
+    return (area * np.diff(edges)).sum(axis=-1)
+
+
+def _type_mask(mcds, cell_type):
+    """
+    Selects the cells of a cell type, given by name or code (None selects
+    every cell)
+    """
+    codes = np.asarray(mcds.data['discrete_cells']['cell_type'])
+    if cell_type is None:
+        return np.ones(codes.shape[0], dtype=bool)
+    return codes == mcds._get_type_code(cell_type)
+
+
+def _types_mask(mcds, cell_types):
+    """
+    Selects the cells of any of several cell types (None selects every cell)
+    """
+    if cell_types is None:
+        return _type_mask(mcds, None)
+    return np.any([_type_mask(mcds, cell_type) for cell_type in cell_types], axis=0)
+
+
+def _cell_positions(mcds, mask):
+    cells = mcds.data['discrete_cells']
+    return np.column_stack((np.asarray(cells['position_x'])[mask],
+                            np.asarray(cells['position_y'])[mask],
+                            np.asarray(cells['position_z'])[mask]))
+
+
+def cross_statistics(mcds, pairs, radii, bounds=None):
+    """
+    Computes cross-type spatial statistics of one time step: Ripley's K and
+    L functions and the pair correlation function g for each pair of cell
+    types. Pairs are counted on KD-trees of the two types, for all radii at
+    once. There is no edge correction, the domain is taken as the window.
+    Runs with a single voxel along z are treated as 2D.
+
+    Parameters
+    ----------
+    mcds : pyMCDS
+        Time step, with at least the cell_type and position variables
+    pairs : list (tuple)
+        (type_a, type_b) pairs of cell types, by name or code. None stands
+        for all cells, and (a, a) gives the statistics of a single type
+    radii : array (float)
+        Increasing radii, in the spatial units of the mesh
+    bounds : array (float) shape=[3, 2], optional
+        Domain bounds (default= data['mesh']['bounds'])
+
+    Returns
+    -------
+    stats_df : pd.DataFrame, shape=[n_pairs * n_radii, 10]
+        Tidy table with columns 'time', 'type_a', 'type_b', 'r', 'pairs'
+        (ordered pairs within r), 'K', 'L' and 'g' (for the shell between
+        the previous radius and r), 'n_a' and 'n_b' (numbers of cells)
+    """
+    radii = np.asarray(radii, dtype=float)
+    if bounds is None:
+        bounds = mcds.data['mesh']['bounds']
+    extent = np.diff(np.asarray(bounds, dtype=float), axis=1).ravel()
+    if extent[2] > 0:
+        dims, window = 3, np.prod(extent)
+        ball = 4. / 3. * np.pi * radii**3
+    else:
+        dims, window = 2, extent[0] * extent[1]
+        ball = np.pi * radii**2
+    shells = np.diff(np.concatenate(([0.], ball)))
+
+    # types are compared and their trees shared by code, so that a type given
+    # by name and by code is recognized as the same
+    def get_code(cell_type):
+        return None if cell_type is None else mcds._get_type_code(cell_type)
+
+    trees = {}
+    def get_tree(code):
+        if code not in trees:
+            trees[code] = cKDTree(_cell_positions(mcds, _type_mask(mcds, code)))
+        return trees[code]
+
+    tables = []
+    for type_a, type_b in pairs:
+        code_a, code_b = get_code(type_a), get_code(type_b)
+        tree_a, tree_b = get_tree(code_a), get_tree(code_b)
+        n_a, n_b = tree_a.n, tree_b.n
+        counts = tree_a.count_neighbors(tree_b, radii).astype(float)
+        if code_a == code_b:
+            # every cell is within r of itself
+            counts -= n_a
+            n_b -= 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            K = window * counts / (n_a * n_b)
+            g = window * np.diff(np.concatenate(([0.], counts))) / (n_a * n_b * shells)
+        L = (K / np.pi)**0.5 if dims == 2 else (3. * K / (4. * np.pi))**(1. / 3.)
+        tables.append(pd.DataFrame({'time': mcds.get_time(), 'type_a': [type_a] * radii.shape[0],
+                                    'type_b': [type_b] * radii.shape[0], 'r': radii,
+                                    'pairs': counts.astype(np.int64), 'K': K, 'L': L, 'g': g,
+                                    'n_a': n_a, 'n_b': tree_b.n}))
+    return pd.concat(tables, ignore_index=True)
+
+
+def neighbourhood_composition(mcds, radius, cell_type=None):
+    """
+    Counts the neighbours of each cell within a radius, per cell type. All
+    pairs of cells within the radius come out of one KD-tree query and are
+    binned by the type of the neighbour with a single bincount.
+
+    Parameters
+    ----------
+    mcds : pyMCDS
+        Time step, with at least the cell_type and position variables
+    radius : float
+        Neighbourhood radius, in the spatial units of the mesh
+    cell_type : str or int, optional
+        Only return the cells of this type (default= None, all cells)
+
+    Returns
+    -------
+    composition_df : pd.DataFrame, shape=[n_cells, 2 + n_types]
+        One row per cell with its 'ID' (if read), 'cell_type' and the
+        number of neighbours of each cell type, one column per type
+    """
+    cells = mcds.data['discrete_cells']
+    types = np.asarray(cells['cell_type']).astype(np.int64)
+    codes = np.unique(types)
+    type_idx = np.searchsorted(codes, types)
+
+    tree = mcds.get_spatial_index().tree
+    pairs = tree.query_pairs(radius, output_type='ndarray')
+    # every pair counts for both of its cells
+    centers = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    neighbours = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    counts = np.bincount(centers * codes.shape[0] + type_idx[neighbours],
+                         minlength=types.shape[0] * codes.shape[0])
+    counts = counts.reshape(types.shape[0], codes.shape[0])
+
+    mask = _type_mask(mcds, cell_type)
+    names = mcds._get_type_names(codes)
+    composition = {}
+    if 'ID' in cells:
+        composition['ID'] = np.asarray(cells['ID'])[mask].astype(np.int64)
+    composition['cell_type'] = np.asarray(mcds._get_type_names(types[mask]))
+    for i, name in enumerate(names):
+        composition[name] = counts[mask, i]
+    return pd.DataFrame(composition)
+
+
+def contact_graph(mcds, tolerance=1., cell_types=None):
+    """
+    Builds the contact graph of the cells of one time step: two cells are
+    in contact when their centers are at most tolerance times the sum of
+    their radii apart, the radii being those of spheres of the cells'
+    total_volume. Candidate pairs come from one KD-tree query at the
+    largest possible contact distance and are then filtered with the
+    radii of each pair.
+
+    Parameters
+    ----------
+    mcds : pyMCDS
+        Time step, with at least the cell_type, position and total_volume
+        variables
+    tolerance : float, optional
+        Scales the contact distance, e.g. 1.1 also links cells with a 10%
+        gap between them (default= 1)
+    cell_types : list (str or int), optional
+        Only these cell types take part in the graph, by name or code
+        (default= None, all cells)
+
+    Returns
+    -------
+    graph : scipy.sparse.csr_matrix (bool) shape=[n_cells, n_cells]
+        Symmetric adjacency matrix, rows and columns are cell indices in
+        data['discrete_cells'] (and rows of get_cell_df())
+    """
+    cells = mcds.data['discrete_cells']
+    n_cells = np.asarray(cells['cell_type']).shape[0]
+    selected = np.flatnonzero(_types_mask(mcds, cell_types))
+
+    positions = _cell_positions(mcds, selected)
+    radii = np.cbrt(3. * np.asarray(cells['total_volume'], dtype=float)[selected] / (4. * np.pi))
+    if selected.shape[0] > 1:
+        pairs = cKDTree(positions).query_pairs(2. * tolerance * radii.max(), output_type='ndarray')
+    else:
+        pairs = np.zeros((0, 2), dtype=np.intp)
+    distances = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    pairs = pairs[distances <= tolerance * (radii[pairs[:, 0]] + radii[pairs[:, 1]])]
+
+    rows = selected[np.concatenate((pairs[:, 0], pairs[:, 1]))]
+    cols = selected[np.concatenate((pairs[:, 1], pairs[:, 0]))]
+    return csr_matrix((np.ones(rows.shape[0], dtype=bool), (rows, cols)),
+                      shape=(n_cells, n_cells))
+
+
+def find_clusters(mcds, tolerance=1., cell_types=None, min_size=1):
+    """
+    Labels the connected components of the contact graph of one time step,
+    e.g. tumor fragments, invasive strands or T cell clusters, and
+    describes each of them.
+
+    Parameters
+    ----------
+    mcds : pyMCDS
+        Time step, with at least the cell_type, position and total_volume
+        variables
+    tolerance, cell_types : optional
+        Contact options, see contact_graph
+    min_size : int, optional
+        Smallest number of cells of the clusters described, at least 1
+        (default= 1)
+
+    Returns
+    -------
+    labels : array (int) shape=[n_cells,]
+        Cluster of each cell, -1 for cells not in the graph or in clusters
+        smaller than min_size
+    clusters_df : pd.DataFrame, shape=[n_clusters, 3 + n_types]
+        One row per cluster, largest first, with columns 'time', 'cluster',
+        'size' and the number of cells of each cell type
+    """
+    if min_size < 1:
+        raise ValueError('min_size must be at least 1, not {}'.format(min_size))
+    graph = contact_graph(mcds, tolerance, cell_types)
+    _, components = connected_components(graph, directed=False)
+
+    types = np.asarray(mcds.data['discrete_cells']['cell_type']).astype(np.int64)
+    in_graph = _types_mask(mcds, cell_types)
+
+    sizes = np.bincount(components[in_graph], minlength=types.shape[0])
+    kept = np.flatnonzero(sizes >= min_size)
+    kept = kept[np.argsort(-sizes[kept], kind='stable')]
+
+    # renumber the kept components from 0, largest first
+    labels = np.full(types.shape[0], -1, dtype=np.intp)
+    order = np.full(types.shape[0], -1, dtype=np.intp)
+    order[kept] = np.arange(kept.shape[0])
+    labels[in_graph] = order[components[in_graph]]
+
+    # every listed cell type gets a column, so that time steps line up
+    codes = np.union1d(types, np.fromiter(mcds.get_cell_types(), dtype=np.int64))
+    member = labels >= 0
+    composition = np.bincount(labels[member] * codes.shape[0]
+                              + np.searchsorted(codes, types[member]),
+                              minlength=kept.shape[0] * codes.shape[0])
+    composition = composition.reshape(kept.shape[0], codes.shape[0])
+
+    clusters = {'time': np.full(kept.shape[0], mcds.get_time()),
+                'cluster': np.arange(kept.shape[0]),
+                'size': sizes[kept]}
+    for i, name in enumerate(mcds._get_type_names(codes)):
+        clusters[name] = composition[:, i]
+    return labels, pd.DataFrame(clusters)
+
+
+def _scan_frame(output_path, xml_file, pairs, radii, schema, bounds):
+    """
+    Cross statistics of one time step of one run, reading only the cell
+    types and positions
+    """
+    mcds = pyMCDS(xml_file, output_path, microenv=False,
+                  cell_variables=['cell_type', 'position'], schema=schema)
+    stats_df = cross_statistics(mcds, pairs, radii, bounds)
+    stats_df.insert(0, 'output_path', str(output_path))
+    return stats_df
+
+
+def scan_cross_statistics(output_paths, pairs, radii, n_workers=None, processes=True):
+    """
+    Computes cross_statistics for every time step of every run of a cohort,
+    one task per time step on a pool of workers. The xml schema and domain
+    of each run are read once.
+
+    Parameters
+    ----------
+    output_paths : list (str)
+        Output directories of the runs
+    pairs, radii : see cross_statistics
+    n_workers : int, optional
+        Number of workers in the pool (default= os.cpu_count())
+    processes : bool, optional
+        If True use a process pool, otherwise a thread pool (default= True)
+
+    Returns
+    -------
+    stats_df : pd.DataFrame
+        Tidy table as returned by cross_statistics, with an additional
+        'output_path' column
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    tasks = []
+    for output_path in output_paths:
+        output_path = Path(output_path)
+        xml_files = sorted(f.name for f in output_path.glob('output*.xml'))
+        if len(xml_files) == 0:
+            continue
+        first = pyMCDS(xml_files[0], output_path, microenv=False, cells=False)
+        bounds = first.data['mesh']['bounds']
+        tasks.extend((output_path, xml_file, first._schema, bounds) for xml_file in xml_files)
+
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=n_workers) as executor:
+        futures = [executor.submit(_scan_frame, output_path, xml_file, pairs, radii, schema, bounds)
+                   for output_path, xml_file, schema, bounds in tasks]
+        tables = [future.result() for future in futures]
+
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,293 @@
+#
+# pyMCDS_store.py - pack a PhysiCell output directory into a single store
+#
+# Usage:
+#  python pyMCDS_store.py output_dir store_dir
+#
+# Packs the outputNNNNNNNN.xml, *_microenvironment0.mat and *_cells.mat files
+# of output_dir (plus the mesh) into store_dir, which holds a handful of .npy
+# arrays and an index instead of thousands of small files. The store is read
+# back with pyMCDS_store(store_dir), whose frames behave like pyMCDS objects.
+#
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from matlab4 import memmap_matlab4, read_matlab4_header
+from pyMCDS import pyMCDS
+from pyMCDS_manifest import update_manifest
+
+_store_format = 'pyMCDS_store'
+_store_version = 1
+
+
+def pack_output(output_path, store_path):
+    """
+    Packs every time step of a PhysiCell output directory into one store.
+    The store holds:
+
+    - xml.npy: the bytes of all xml files, one after the other
+    - mesh.npy: the [4, n_voxels] voxel centers and volumes
+    - substrates.npy: a [n_time_steps, n_species, n_voxels] array, in the
+      voxel order of the .mat files
+    - cells.npy: the [n_labels, n_cells] matrices of all time steps side by
+      side (column-major, so each time step is one contiguous chunk)
+    - index.json: the xml names, times and the offsets of each time step in
+      xml.npy and cells.npy
+
+    Parameters
+    ----------
+    output_path : str
+        Path to the directory where the PhysiCell output files are stored
+    store_path : str
+        Path to the store directory, created if needed
+
+    Returns
+    -------
+    store_path : pathlib.Path
+    """
+    output_path = Path(output_path)
+    store_path = Path(store_path)
+    # the times and file names of the time steps come from the manifest,
+    # only the first xml is parsed here and the .mat files are streamed into
+    # the store
+    entries = update_manifest(output_path, processes=False)
+    if len(entries) == 0:
+        raise FileNotFoundError("No output*.xml files found in '{}'".format(output_path))
+    for entry in entries:
+        if entry['microenvironment_file'] is None or entry['cells_file'] is None:
+            raise ValueError("'{}' references no microenvironment or no cells file".format(
+                output_path / entry['xml_file']))
+    store_path.mkdir(parents=True, exist_ok=True)
+
+    xml_files = [entry['xml_file'] for entry in entries]
+    first = pyMCDS(xml_files[0], output_path, microenv=False, cells=False, memmap=True)
+    species_names = first.get_substrate_names()
+
+    mesh = first.data['mesh']
+    n_voxels = mesh['voxels']['volumes'].shape[0]
+    np.save(store_path / 'mesh.npy',
+            np.vstack((mesh['voxels']['centers'], mesh['voxels']['volumes'])))
+
+    xml_bytes = [(output_path / xml_file).read_bytes() for xml_file in xml_files]
+    xml_offsets = [0] + [int(offset) for offset in np.cumsum([len(b) for b in xml_bytes])]
+    np.save(store_path / 'xml.npy', np.frombuffer(b''.join(xml_bytes), dtype=np.uint8))
+
+    me_paths = [output_path / entry['microenvironment_file'] for entry in entries]
+    cell_paths = [output_path / entry['cells_file'] for entry in entries]
+
+    substrates = np.lib.format.open_memmap(
+        store_path / 'substrates.npy', mode='w+', dtype=float,
+        shape=(len(entries), len(species_names), n_voxels))
+    for t, me_path in enumerate(me_paths):
+        print('Packing {}'.format(me_path))
+        me_data = memmap_matlab4(me_path)
+        if me_data.shape != (4 + len(species_names), n_voxels):
+            raise ValueError("'{}' does not match the mesh and substrates of '{}'".format(
+                me_path, first._xml_file))
+        substrates[t] = me_data[4:, :]
+    substrates.flush()
+    del substrates
+
+    headers = [read_matlab4_header(cell_path) for cell_path in cell_paths]
+    n_rows = headers[0]['rows']
+    if any(header['rows'] != n_rows for header in headers):
+        raise ValueError("The cells .mat files in '{}' do not all have the same labels".format(output_path))
+    cell_offsets = np.concatenate(([0], np.cumsum([header['cols'] for header in headers])))
+
+    if cell_offsets[-1] == 0:
+        np.save(store_path / 'cells.npy', np.zeros((n_rows, 0)))
+    else:
+        cells = np.lib.format.open_memmap(
+            store_path / 'cells.npy', mode='w+', dtype=float,
+            shape=(n_rows, int(cell_offsets[-1])), fortran_order=True)
+        for t, cell_path in enumerate(cell_paths):
+            print('Packing {}'.format(cell_path))
+            cells[:, cell_offsets[t]:cell_offsets[t+1]] = memmap_matlab4(cell_path)
+        cells.flush()
+        del cells
+
+    # the index is written last, a store without one is incomplete
+    index = {'format': _store_format, 'version': _store_version,
+             'xml_files': xml_files,
+             'times': [entry['current_time'] for entry in entries],
+             'substrates': species_names,
+             'xml_offsets': xml_offsets,
+             'cell_offsets': [int(offset) for offset in cell_offsets]}
+    with open(store_path / 'index.json', 'w') as f:
+        json.dump(index, f, indent=1)
+
+    return store_path
+
+
+class _StoreMCDS(pyMCDS):
+    """
+    pyMCDS of one time step of a pyMCDS_store. The xml is parsed from the
+    store and the mesh, concentrations and cells are read from its arrays
+    instead of the .mat files.
+    """
+    def __init__(self, store, frame, **kwargs):
+        self._store = store
+        self._frame = frame
+        kwargs['cache'] = False
+        super().__init__(store.xml_files[frame], store.store_path, **kwargs)
+
+    def _read_xml_bytes(self, xml_file):
+        start, stop = self._store._xml_offsets[self._frame:self._frame+2]
+        return self._store._xml[start:stop].tobytes()
+
+    def _read_mesh(self):
+        mesh = super()._read_mesh()
+        # the voxel map is keyed on the file the voxels were read from
+        mesh['voxels']['filename'] = self._store.store_path / 'mesh.npy'
+        return mesh
+
+    def _read_voxels_file(self, voxel_path):
+        if self._memmap:
+            return self._store._mesh
+        return np.array(self._store._mesh)
+
+    def _read_species_rows(self, me_path, n_species):
+        return self._store.substrates[self._frame, :n_species, :]
+
+    def _read_cells_file(self, cell_path, rows=None, memmap=False):
+        start, stop = self._store._cell_offsets[self._frame:self._frame+2]
+        cell_data = self._store.cells[:, start:stop]
+        if memmap:
+            return cell_data
+        if rows is not None:
+            cell_data = cell_data[np.asarray(rows, dtype=np.intp), :]
+        return np.array(cell_data, dtype=float)
+
+    def get_substrate_rows(self, species_names=None, volumes=False, voxels=None):
+        sub_name_list = self.get_substrate_names()
+        if species_names is None:
+            species_names = sub_name_list
+
+        rows = []
+        for species_name in species_names:
+            if species_name not in sub_name_list:
+                raise KeyError('Substrate {} not in {}'.format(species_name, self._xml_file))
+            rows.append(sub_name_list.index(species_name))
+
+        if voxels is None:
+            voxels = slice(None)
+        substrate_rows = self._store.substrates[self._frame][:, voxels][rows, :]
+        if volumes:
+            substrate_rows = np.vstack((self._store._mesh[3, voxels], substrate_rows))
+        return np.array(substrate_rows, dtype=float)
+
+
+class pyMCDS_store:
+    """
+    This class reads a store written by pack_output. Every time step is
+    available in constant time, as a pyMCDS whose arrays are read from the
+    memory-mapped store instead of the output files.
+
+    Parameters
+    ----------
+    store_path : str
+        Path to the store directory
+
+    Attributes
+    ----------
+    xml_files : list (str)
+        Names of the packed outputNNNNNNNN.xml files
+    times : list (float)
+        Simulated time of each time step
+    substrates : np.memmap, shape=[n_time_steps, n_species, n_voxels]
+        Concentrations of every time step, in the voxel order of the .mat files
+    cells : np.memmap, shape=[n_labels, n_cells]
+        Cell matrices of every time step side by side
+    """
+    def __init__(self, store_path):
+        self.store_path = Path(store_path)
+        index_path = self.store_path / 'index.json'
+        if not index_path.is_file():
+            raise FileNotFoundError("No such file or directory:\n'{}'".format(index_path))
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('format') != _store_format or index.get('version') != _store_version:
+            raise ValueError("'{}' is not a version {} pyMCDS store".format(
+                self.store_path, _store_version))
+
+        self.xml_files = index['xml_files']
+        self.times = index['times']
+        self._xml_offsets = index['xml_offsets']
+        self._cell_offsets = index['cell_offsets']
+
+        self._xml = np.load(self.store_path / 'xml.npy', mmap_mode='r')
+        self._mesh = np.load(self.store_path / 'mesh.npy', mmap_mode='r')
+        self.substrates = np.load(self.store_path / 'substrates.npy', mmap_mode='r')
+        self.cells = np.load(self.store_path / 'cells.npy', mmap_mode='r')
+        self.mesh = None
+        self.schema = None
+
+    def __getstate__(self):
+        # reopen the store instead of pickling the memory maps
+        return {'store_path': self.store_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['store_path'])
+
+    def __len__(self):
+        return len(self.xml_files)
+
+    def __getitem__(self, idx):
+        return self.get_mcds(idx)
+
+    def get_mcds(self, idx, microenv=True, cells=True, lazy=True, cell_variables=None,
+                 dtype=None, memmap=False):
+        """
+        Returns the pyMCDS of a single time step. The mesh and the xml schema
+        are read once and shared by all time steps.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the time step
+        microenv, cells, lazy, cell_variables, dtype, memmap : optional
+            Loading options, as for pyMCDS
+
+        Returns
+        -------
+        mcds : pyMCDS
+        """
+        if idx < 0:
+            idx += len(self)
+        if self.mesh is None:
+            first = _StoreMCDS(self, 0, microenv=False, cells=False, memmap=True)
+            self.mesh = first.data['mesh']
+            self.schema = first._schema
+        return _StoreMCDS(self, idx, microenv=microenv, cells=cells, lazy=lazy,
+                          mesh=self.mesh, cell_variables=cell_variables, dtype=dtype,
+                          memmap=memmap, schema=self.schema)
+
+    def get_times(self):
+        """
+        Returns the simulated time of each time step
+
+        Returns
+        -------
+        times : list (float), shape=[n_time_steps,]
+        """
+        return list(self.times)
+
+    def get_cell_counts(self):
+        """
+        Returns the number of cells in each time step, without reading them
+
+        Returns
+        -------
+        counts : array (int), shape=[n_time_steps,]
+        """
+        return np.diff(self._cell_offsets)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python pyMCDS_store.py output_dir store_dir')
+        sys.exit(1)
+    pack_output(sys.argv[1], sys.argv[2])
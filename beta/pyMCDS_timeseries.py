@@ -0,0 +1,616 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pyMCDS import pyMCDS
+from pyMCDS_manifest import update_manifest
+from pyMCDS_spatial import find_clusters
+from pyMCDS_tracks import Trajectories
+
+# mesh shared by all frames loaded in a worker process, set once per worker
+_worker_mesh = None
+
+def _init_worker(mesh):
+    global _worker_mesh
+    _worker_mesh = mesh
+
+def _load_frame(xml_file, output_path, microenv, cells, cache, cell_variables, dtype,
+                memmap, schema, mesh=None):
+    """
+    Loads one time step completely. In a worker process the shared mesh is
+    taken from the worker and stripped again before the frame is sent back,
+    so only the per-frame data crosses the process boundary.
+    """
+    in_worker = mesh is None
+    if in_worker:
+        mesh = _worker_mesh
+
+    mcds = pyMCDS(xml_file, output_path, microenv=microenv, cells=cells,
+                  lazy=False, mesh=mesh, cache=cache, cell_variables=cell_variables,
+                  dtype=dtype, memmap=memmap, schema=schema)
+    if in_worker:
+        dict.pop(mcds.data, 'mesh')
+    return mcds
+
+def _summarize_frame(xml_file, output_path, species_names, percentiles, schema):
+    """
+    Substrate reductions of one time step, read row by row from the
+    microenvironment .mat file
+    """
+    mcds = pyMCDS(xml_file, output_path, cells=False, schema=schema)
+    return mcds.get_substrate_summary(species_names, percentiles)
+
+def _summarize_population(xml_file, output_path, variables, percentiles, dead, schema):
+    """
+    Cell counts and cell variable reductions of one time step, reading only
+    the cell variables they need
+    """
+    cell_variables = ['cell_type', 'current_phase'] + list(variables)
+    if 'dead' in schema['data_labels']:
+        cell_variables.append('dead')
+    mcds = pyMCDS(xml_file, output_path, microenv=False, cell_variables=cell_variables,
+                  schema=schema)
+    return mcds.get_population_counts(), mcds.get_cell_summary(variables, percentiles, dead)
+
+def _profile_frame(xml_file, output_path, bins, n_quantiles, center, dead, schema, mesh=None):
+    """
+    Radial profile of one time step, reading only the cell type, position
+    and dead variables
+    """
+    if mesh is None:
+        mesh = _worker_mesh
+    cell_variables = ['cell_type', 'position']
+    if 'dead' in schema['data_labels']:
+        cell_variables.append('dead')
+    elif dead:
+        cell_variables.append('current_phase')
+    mcds = pyMCDS(xml_file, output_path, microenv=False, mesh=mesh,
+                  cell_variables=cell_variables, schema=schema)
+    return mcds.get_radial_profile(bins, n_quantiles, center, dead)
+
+def _density_frame(xml_file, output_path, cell_type, volume_fraction, schema, mesh=None):
+    """
+    Cell density field of one time step, reading only the cell type,
+    position and volume variables
+    """
+    if mesh is None:
+        mesh = _worker_mesh
+    cell_variables = ['cell_type', 'position']
+    if volume_fraction:
+        cell_variables.append('total_volume')
+    mcds = pyMCDS(xml_file, output_path, microenv=False, mesh=mesh,
+                  cell_variables=cell_variables, schema=schema)
+    return mcds.get_time(), mcds.get_cell_density(cell_type, volume_fraction)
+
+def _expose_frame(xml_file, output_path, species_names, interpolation, dtype, schema, mesh=None):
+    """
+    Concentrations at the position of every cell of one time step, reading
+    only the cell IDs and positions and the voxels around them
+    """
+    if mesh is None:
+        mesh = _worker_mesh
+    mcds = pyMCDS(xml_file, output_path, mesh=mesh, cell_variables=['ID', 'position'],
+                  schema=schema)
+    cells = mcds.data['discrete_cells']
+    positions = np.column_stack((cells['position_x'], cells['position_y'], cells['position_z']))
+    concs = mcds.get_concentrations_at_points(positions, species_names, interpolation,
+                                              from_file=True)
+    if dtype is not None:
+        concs = concs.astype(dtype)
+    return mcds.get_time(), np.asarray(cells['ID']).astype(np.int64), concs
+
+def _track_frame(xml_file, output_path, schema):
+    """
+    IDs, positions and cell types of one time step, reading only those rows
+    of the cells .mat file
+    """
+    mcds = pyMCDS(xml_file, output_path, microenv=False,
+                  cell_variables=['ID', 'position', 'cell_type'], schema=schema)
+    cells = mcds.data['discrete_cells']
+    positions = np.column_stack((cells['position_x'], cells['position_y'], cells['position_z']))
+    return (mcds.get_time(), np.asarray(cells['ID']).astype(np.int64), positions,
+            np.asarray(cells['cell_type']).astype(np.int64))
+
+
+def _cluster_frame(xml_file, output_path, tolerance, cell_types, min_size, schema):
+    """
+    Clusters of one time step, reading only the rows of the cells .mat file
+    needed for the contact graph
+    """
+    mcds = pyMCDS(xml_file, output_path, microenv=False,
+                  cell_variables=['cell_type', 'position', 'total_volume'], schema=schema)
+    return find_clusters(mcds, tolerance, cell_types, min_size)[1]
+
+
+class pyMCDS_timeseries:
+    """
+    This class gives access to all of the time steps stored in a PhysiCell
+    output directory. The mesh and the xml schema (labels, species and mesh
+    coordinates) are read once and shared by every time step, and the time
+    steps themselves can be loaded in parallel or streamed one at a time.
+
+    Parameters
+    ----------
+    output_path: str, optional
+        String containing the path (relative or absolute) to the directory
+        where PhysiCell output files are stored (default= ".")
+    microenv: bool, optional
+        If False, the microenvironment .mat files are never read (default= True)
+    cells: bool, optional
+        If False, the cells .mat files are never read (default= True)
+    cache: bool or str, optional
+        Sidecar cache option passed on to every pyMCDS (default= False)
+    cell_variables: list (str), optional
+        Cell variables to read, passed on to every pyMCDS (default= None, all)
+    dtype: numpy dtype, optional
+        Reduced precision option passed on to every pyMCDS (default= None)
+    memmap: bool, optional
+        Memory-mapping option passed on to every pyMCDS. Frames loaded by a
+        process pool are copied into memory when they are sent back
+        (default= False)
+
+    Attributes
+    ----------
+    xml_files : list (str)
+        Sorted names of the outputNNNNNNNN.xml files in output_path
+    mesh : dict
+        The data['mesh'] container shared by every time step
+    schema : dict
+        The xml schema shared by every time step
+    """
+    def __init__(self, output_path='.', microenv=True, cells=True, cache=False,
+                 cell_variables=None, dtype=None, memmap=False):
+        self.output_path = Path(output_path)
+        self.microenv = microenv
+        self.cells = cells
+        self.cache = cache
+        self.cell_variables = cell_variables
+        self.dtype = dtype
+        self.memmap = memmap
+        self.xml_files = sorted(f.name for f in self.output_path.glob('output*.xml'))
+        if len(self.xml_files) == 0:
+            raise FileNotFoundError(
+                "No output*.xml files found in '{}'".format(self.output_path))
+
+        first = pyMCDS(self.xml_files[0], self.output_path, microenv=False, cells=False)
+        self.mesh = first.data['mesh']
+        self.schema = first._schema
+        self._mcds_list = None
+
+    def __len__(self):
+        return len(self.xml_files)
+
+    def __getitem__(self, idx):
+        """
+        Returns the pyMCDS of a single time step, read lazily on the shared
+        mesh.
+        """
+        if self._mcds_list is not None:
+            return self._mcds_list[idx]
+        return pyMCDS(self.xml_files[idx], self.output_path, microenv=self.microenv,
+                      cells=self.cells, mesh=self.mesh, cache=self.cache,
+                      cell_variables=self.cell_variables, dtype=self.dtype,
+                      memmap=self.memmap, schema=self.schema)
+
+    def _executor(self, n_workers, processes):
+        if processes:
+            return ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                       initargs=(self.mesh,))
+        return ThreadPoolExecutor(max_workers=n_workers)
+
+    def _submit(self, executor, xml_file, processes):
+        mesh = None if processes else self.mesh
+        return executor.submit(_load_frame, xml_file, self.output_path, self.microenv,
+                               self.cells, self.cache, self.cell_variables, self.dtype,
+                               self.memmap, self.schema, mesh)
+
+    def _attach_mesh(self, mcds):
+        mcds.data['mesh'] = self.mesh
+        return mcds
+
+    def load(self, n_workers=None, processes=True):
+        """
+        Reads every time step, spreading the work over a pool of workers.
+        With processes=True scripts must guard their entry point with
+        if __name__ == '__main__' on platforms that spawn new processes.
+
+        Parameters
+        ----------
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        mcds_list : list (pyMCDS), shape=[n_time_steps,]
+            Fully loaded time steps in output order
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            futures = [self._submit(executor, xml_file, processes)
+                       for xml_file in self.xml_files]
+            self._mcds_list = [self._attach_mesh(future.result()) for future in futures]
+
+        return self._mcds_list
+
+    def get_mcds_list(self):
+        """
+        Returns all time steps, loading them first if needed
+        """
+        if self._mcds_list is None:
+            self.load()
+        return self._mcds_list
+
+    def get_manifest(self, n_workers=None, processes=False):
+        """
+        Returns the manifest entry of each time step, see
+        pyMCDS_manifest.update_manifest. Only time steps that are not in the
+        manifest of output_path yet are parsed.
+
+        Parameters
+        ----------
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool. The
+            manifest only reads the xml and the .mat headers, so threads are
+            enough and need no if __name__ == '__main__' guard
+            (default= False)
+
+        Returns
+        -------
+        frames : list (dict), shape=[n_time_steps,]
+        """
+        frames = update_manifest(self.output_path, n_workers, processes)
+        manifest = {entry['xml_file']: entry for entry in frames}
+        return [manifest[xml_file] for xml_file in self.xml_files]
+
+    def get_times(self, n_workers=None, processes=False):
+        """
+        Returns the simulated time of each time step
+
+        Parameters
+        ----------
+        n_workers, processes : optional
+            Pool options for the manifest, see get_manifest
+
+        Returns
+        -------
+        times : list (float), shape=[n_time_steps,]
+        """
+        return [entry['current_time'] for entry in self.get_manifest(n_workers, processes)]
+
+    def get_cell_counts(self, n_workers=None, processes=False):
+        """
+        Returns the number of cells in each time step, without reading them
+
+        Parameters
+        ----------
+        n_workers, processes : optional
+            Pool options for the manifest, see get_manifest
+
+        Returns
+        -------
+        counts : list (int), shape=[n_time_steps,]
+            None for time steps without a cells file
+        """
+        return [entry['n_cells'] for entry in self.get_manifest(n_workers, processes)]
+
+    def iter_mcds(self, n_workers=None, processes=True, prefetch=None):
+        """
+        Generator over the time steps in output order. At most prefetch time
+        steps are held in memory at once, loaded ahead of time by the pool,
+        so analyses can stream over series that do not fit in memory.
+
+        Parameters
+        ----------
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+        prefetch : int, optional
+            Maximum number of time steps loaded ahead (default= n_workers)
+
+        Yields
+        ------
+        mcds : pyMCDS
+            Fully loaded time step
+        """
+        def submit(executor, xml_file):
+            return self._submit(executor, xml_file, processes)
+
+        for mcds in self._iter_submitted(submit, n_workers, processes, prefetch):
+            yield self._attach_mesh(mcds)
+
+    def _iter_submitted(self, submit, n_workers, processes, prefetch):
+        """
+        Yields the results of submit(executor, xml_file) for every time step
+        in output order, keeping at most prefetch of them in flight
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        if prefetch is None:
+            prefetch = n_workers
+
+        with self._executor(n_workers, processes) as executor:
+            pending = deque()
+            xml_files = iter(self.xml_files)
+            for xml_file in xml_files:
+                pending.append(submit(executor, xml_file))
+                if len(pending) >= prefetch:
+                    break
+
+            while pending:
+                result = pending.popleft().result()
+                xml_file = next(xml_files, None)
+                if xml_file is not None:
+                    pending.append(submit(executor, xml_file))
+                yield result
+
+    def iter_cell_density(self, cell_type=None, volume_fraction=False, n_workers=None,
+                          processes=True, prefetch=None):
+        """
+        Generator over the cell density fields of the time steps in output
+        order, see pyMCDS.get_cell_density. Only the fields cross the process
+        boundary, and at most prefetch of them are held at once.
+
+        Parameters
+        ----------
+        cell_type, volume_fraction : optional
+            Density options, as for pyMCDS.get_cell_density
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+        prefetch : int, optional
+            Maximum number of time steps computed ahead (default= n_workers)
+
+        Yields
+        ------
+        time : float
+            Simulated time of the time step
+        density : array (float) shape=[ny_voxel, nx_voxel, nz_voxel]
+            Number of cells, or volume fraction, in each voxel
+        """
+        mesh = None if processes else self.mesh
+
+        def submit(executor, xml_file):
+            return executor.submit(_density_frame, xml_file, self.output_path, cell_type,
+                                   volume_fraction, self.schema, mesh)
+
+        yield from self._iter_submitted(submit, n_workers, processes, prefetch)
+
+    def get_substrate_summary(self, species_names=None, percentiles=(), n_workers=None,
+                              processes=True):
+        """
+        Reduces the chemical species of every time step in one pass over the
+        series. Only the requested rows of each microenvironment .mat file are
+        read, the meshgrid arrays are never built.
+
+        Parameters
+        ----------
+        species_names : list (str), optional
+            Chemical species to summarize (default= all)
+        percentiles : list (float), optional
+            Percentiles (0-100) to compute in addition to the fixed reductions
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        summary_df : pd.DataFrame, shape=[n_time_steps * n_species, 7 + n_percentiles]
+            Tidy table with one row per time step and species, see
+            pyMCDS.get_substrate_summary for the columns
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            futures = [executor.submit(_summarize_frame, xml_file, self.output_path,
+                                       species_names, tuple(percentiles), self.schema)
+                       for xml_file in self.xml_files]
+            summaries = [future.result() for future in futures]
+
+        return pd.concat(summaries, ignore_index=True)
+
+    def get_population_summary(self, variables=(), percentiles=(), dead=False,
+                               n_workers=None, processes=True):
+        """
+        Counts and reduces the cells of every time step in one pass over the
+        series, see pyMCDS.get_population_counts and pyMCDS.get_cell_summary.
+        Only the cell type, phase, dead and requested variables are read from
+        each cells .mat file.
+
+        Parameters
+        ----------
+        variables : list (str), optional
+            Cell variables to summarize per cell type (default= none, counts
+            only)
+        percentiles : list (float), optional
+            Percentiles (0-100) to compute in addition to the fixed reductions
+        dead : bool, optional
+            If True, the live and dead cells of each type are summarized
+            separately (default= False)
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        counts_df : pd.DataFrame
+            Tidy table with one row per time step, cell type, phase and
+            live/dead state present
+        summary_df : pd.DataFrame
+            Tidy table with one row per time step, cell type and variable,
+            empty if no variables are given
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            futures = [executor.submit(_summarize_population, xml_file, self.output_path,
+                                       tuple(variables), tuple(percentiles), dead, self.schema)
+                       for xml_file in self.xml_files]
+            counts, summaries = zip(*(future.result() for future in futures))
+
+        return pd.concat(counts, ignore_index=True), pd.concat(summaries, ignore_index=True)
+
+    def get_radial_profiles(self, bins=20, n_quantiles=20, center=None, dead=False,
+                            n_workers=None, processes=True):
+        """
+        Radial profiles of the cells of every time step, see
+        pyMCDS.get_radial_profile. The bins are the same for every time step.
+
+        Parameters
+        ----------
+        bins, n_quantiles, center, dead : optional
+            Profile options, as for pyMCDS.get_radial_profile
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        profile_df : pd.DataFrame
+            Tidy table with one row per time step and cell type, with the bin
+            edges and quantile levels in profile_df.attrs
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            mesh = None if processes else self.mesh
+            futures = [executor.submit(_profile_frame, xml_file, self.output_path, bins,
+                                       n_quantiles, center, dead, self.schema, mesh)
+                       for xml_file in self.xml_files]
+            profiles = [future.result() for future in futures]
+
+        return pd.concat(profiles, ignore_index=True)
+
+    def get_exposure_history(self, species_names=None, interpolation='nearest', n_workers=None,
+                             processes=True):
+        """
+        Reconstructs the concentrations every cell was exposed to over the
+        series. Each time step samples the chemical species at the position
+        of all of its cells in one call, reading only the voxels around them,
+        and the cells are then joined across time steps by ID with one stable
+        sort. The values are stored in the reduced precision dtype of the
+        series, if one was given.
+
+        Parameters
+        ----------
+        species_names : list (str), optional
+            Chemical species to sample (default= all)
+        interpolation : str, optional
+            'nearest' or 'linear', see pyMCDS.get_concentrations_at_points
+            (default= 'nearest')
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        exposure_df : pd.DataFrame, shape=[n_cells * n_time_steps, 2 + n_species]
+            One row per cell and time step it is present in, with columns
+            'ID', 'time' and one column per species. Rows are sorted by ID
+            and then time, so the history of each cell is contiguous
+        """
+        if species_names is None:
+            species_names = [variable['name'] for variable in self.schema['variables']]
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            mesh = None if processes else self.mesh
+            futures = [executor.submit(_expose_frame, xml_file, self.output_path, species_names,
+                                       interpolation, self.dtype, self.schema, mesh)
+                       for xml_file in self.xml_files]
+            times, ids, concs = zip(*(future.result() for future in futures))
+
+        times = np.repeat(times, [frame_ids.shape[0] for frame_ids in ids])
+        ids = np.concatenate(ids)
+        concs = np.concatenate(concs)
+        # time steps are in output order, a stable sort by ID keeps them so
+        order = np.argsort(ids, kind='stable')
+
+        exposure = {'ID': ids[order], 'time': times[order]}
+        for si, species_name in enumerate(species_names):
+            exposure[species_name] = concs[order, si]
+        return pd.DataFrame(exposure)
+
+    def get_trajectories(self, n_workers=None, processes=True):
+        """
+        Reads the tracks of all cells of the series, see
+        pyMCDS_tracks.Trajectories for the motility statistics. Only the ID,
+        position and cell_type rows of each cells .mat file are read.
+
+        Parameters
+        ----------
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        trajectories : pyMCDS_tracks.Trajectories
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count()
+
+        with self._executor(n_workers, processes) as executor:
+            futures = [executor.submit(_track_frame, xml_file, self.output_path, self.schema)
+                       for xml_file in self.xml_files]
+            frames = [future.result() for future in futures]
+
+        return Trajectories.from_frames(frames, self.schema['cell_types'])
+
+    def get_clusters(self, tolerance=1., cell_types=None, min_size=1, n_workers=None,
+                     processes=True):
+        """
+        Finds the clusters of touching cells of every time step, see
+        pyMCDS_spatial.find_clusters. Each time step builds its contact graph
+        in its own worker, reading only the cell types, positions and
+        volumes.
+
+        Parameters
+        ----------
+        tolerance, cell_types, min_size : optional
+            Cluster options, as for pyMCDS_spatial.find_clusters
+        n_workers : int, optional
+            Number of workers in the pool (default= os.cpu_count())
+        processes : bool, optional
+            If True use a process pool, otherwise a thread pool (default= True)
+
+        Returns
+        -------
+        clusters_df : pd.DataFrame
+            One row per cluster and time step, with columns 'time',
+            'cluster', 'size' and the number of cells of each cell type
+        """
+        if min_size < 1:
+            raise ValueError('min_size must be at least 1, not {}'.format(min_size))
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        if cell_types is not None:
+            cell_types = tuple(cell_types)
+
+        with self._executor(n_workers, processes) as executor:
+            futures = [executor.submit(_cluster_frame, xml_file, self.output_path, tolerance,
+                                       cell_types, min_size, self.schema)
+                       for xml_file in self.xml_files]
+            clusters = [future.result() for future in futures]
+
+        return pd.concat(clusters, ignore_index=True)
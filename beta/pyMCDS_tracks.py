@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+
+class Trajectories:
+    """
+    This class holds the tracks of all cells of a series, aligned on their
+    IDs: positions[t, c] is the position of cell ids[c] at times[t], NaN
+    while the cell does not exist (before its birth, after its death or
+    removal). The motility statistics are computed over all cells at once,
+    and averaged per cell type. Cells are grouped by the cell type they had
+    when they first appeared.
+
+    Lags and times between steps are taken from the output times, the
+    statistics assume that the series is saved at a regular interval.
+
+    Parameters
+    ----------
+    times : array (float) shape=[n_time_steps,]
+        Simulated time of each time step
+    ids : array (int) shape=[n_cells,]
+        Sorted IDs of all cells that appear in the series
+    positions : array (float) shape=[n_time_steps, n_cells, 3]
+        x, y and z position of each cell at each time step
+    cell_types : array (int) shape=[n_time_steps, n_cells]
+        cell_type code of each cell at each time step, -1 where it does not
+        exist
+    type_names : dict, optional
+        Maps cell_type codes to names, as returned by pyMCDS.get_cell_types
+
+    Attributes
+    ----------
+    cell_type : array (int) shape=[n_cells,]
+        cell_type code of each cell when it first appeared
+    """
+    def __init__(self, times, ids, positions, cell_types, type_names=None):
+        self.times = np.asarray(times, dtype=float)
+        self.ids = np.asarray(ids)
+        self.positions = positions
+        self.cell_types = cell_types
+        self.type_names = {} if type_names is None else dict(type_names)
+
+        present = cell_types >= 0
+        first = np.argmax(present, axis=0)
+        self.cell_type = cell_types[first, np.arange(self.ids.shape[0])]
+
+    @classmethod
+    def from_frames(cls, frames, type_names=None):
+        """
+        Aligns the cells of several time steps on their IDs with sorted-ID
+        joins into one preallocated array
+
+        Parameters
+        ----------
+        frames : list (tuple)
+            (time, ids, positions [n, 3], cell_types) of each time step, in
+            output order
+        type_names : dict, optional
+            Maps cell_type codes to names
+
+        Returns
+        -------
+        trajectories : Trajectories
+        """
+        times = [frame[0] for frame in frames]
+        ids = np.unique(np.concatenate([np.asarray(frame[1], dtype=np.int64) for frame in frames]))
+
+        positions = np.full((len(frames), ids.shape[0], 3), np.nan)
+        cell_types = np.full((len(frames), ids.shape[0]), -1, dtype=np.int64)
+        for t, (_, frame_ids, frame_positions, frame_types) in enumerate(frames):
+            columns = np.searchsorted(ids, np.asarray(frame_ids, dtype=np.int64))
+            positions[t, columns] = frame_positions
+            cell_types[t, columns] = frame_types
+        return cls(times, ids, positions, cell_types, type_names)
+
+    def _type_name(self, code):
+        return self.type_names.get(code, code)
+
+    def get_displacements(self, lag=1):
+        """
+        Returns the displacement of every cell over lag time steps
+
+        Returns
+        -------
+        displacements : array (float) shape=[n_time_steps - lag, n_cells, 3]
+            NaN where the cell does not exist at either end
+        """
+        return self.positions[lag:] - self.positions[:-lag]
+
+    def get_speeds(self):
+        """
+        Returns the speed of every cell between consecutive time steps
+
+        Returns
+        -------
+        speeds : array (float) shape=[n_time_steps - 1, n_cells]
+            Distance travelled divided by the time between the steps, NaN
+            where the cell does not exist at either step or where the time
+            does not increase
+        """
+        steps = np.linalg.norm(self.get_displacements(), axis=-1)
+        # repeated time steps (e.g. restarts) have no defined speed
+        dt = np.diff(self.times)
+        dt[dt <= 0] = np.nan
+        return steps / dt[:, np.newaxis]
+
+    def get_turning_angles(self):
+        """
+        Returns the angle between consecutive displacements of every cell
+
+        Returns
+        -------
+        angles : array (float) shape=[n_time_steps - 2, n_cells]
+            Turning angles in radians (0 keeps the direction, pi reverses
+            it), NaN where the cell does not exist or does not move
+        """
+        displacements = self.get_displacements()
+        before, after = displacements[:-1], displacements[1:]
+        norms = np.linalg.norm(before, axis=-1) * np.linalg.norm(after, axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos = np.einsum('tcx,tcx->tc', before, after) / norms
+        cos[norms == 0] = np.nan
+        return np.arccos(np.clip(cos, -1., 1.))
+
+    def _mean_by_type(self, values):
+        """
+        Mean of values [..., n_cells] over all non-NaN entries of the cells
+        of each type, with the number of entries
+        """
+        codes = np.unique(self.cell_type)
+        group = np.searchsorted(codes, self.cell_type)
+        values = values.reshape(-1, self.ids.shape[0])
+        valid = ~np.isnan(values)
+        groups = np.broadcast_to(group, values.shape)[valid]
+        counts = np.bincount(groups, minlength=codes.shape[0])
+        sums = np.bincount(groups, weights=values[valid], minlength=codes.shape[0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return codes, sums / counts, counts
+
+    def get_msd(self, max_lag=None):
+        """
+        Returns the mean squared displacement of each cell type, averaged
+        over all cells and all time origins. All lags are computed at once
+        from correlations along time, taken with FFTs over all cells, in
+        O(n_time_steps * log(n_time_steps) * n_cells) operations; missing
+        positions (NaN) are left out of the averages.
+
+        Parameters
+        ----------
+        max_lag : int, optional
+            Largest lag, in time steps (default= n_time_steps - 1)
+
+        Returns
+        -------
+        msd_df : pd.DataFrame, shape=[n_types * max_lag, 5]
+            Tidy table with columns 'cell_type', 'lag' (time steps),
+            'time_lag', 'msd' and 'n' (number of displacements averaged)
+        """
+        n_times = self.times.shape[0]
+        if max_lag is None:
+            max_lag = n_times - 1
+
+        # |x(t+lag) - x(t)|^2 summed over the origins where the cell exists at
+        # both ends is corr(w, q) + corr(q, w) - 2 corr(x, x), with w the
+        # presence of the cell, x its position (0 where missing) and q = |x|^2.
+        # Positions are centered on each cell's mean to keep the FFTs accurate.
+        present = ~np.isnan(self.positions[..., 0])
+        with np.errstate(invalid='ignore'):
+            mean = np.nanmean(self.positions, axis=0)
+        x = np.where(present[..., np.newaxis], self.positions - mean, 0.)
+        n_fft = 2 * n_times
+
+        def spectrum(values):
+            return np.fft.rfft(values, n_fft, axis=0)
+
+        def correlate(a, b):
+            # sum over t of a(t) b(t + lag), for lags 1 to max_lag
+            return np.fft.irfft(np.conj(a) * b, n_fft, axis=0)[1:max_lag + 1]
+
+        w = spectrum(present.astype(float))
+        q = spectrum(np.sum(x**2, axis=-1))
+        xs = spectrum(x)
+        counts = np.rint(correlate(w, w))
+        sums = correlate(w, q) + correlate(q, w) - 2. * np.sum(correlate(xs, xs), axis=-1)
+
+        codes, group = np.unique(self.cell_type, return_inverse=True)
+        members = np.zeros((self.ids.shape[0], codes.shape[0]))
+        members[np.arange(self.ids.shape[0]), group] = 1.
+        counts = (counts @ members).astype(np.int64)
+        msd = np.full(counts.shape, np.nan)
+        np.divide(sums @ members, counts, out=msd, where=counts > 0)
+
+        lags = np.arange(1, max_lag + 1)
+        return pd.DataFrame({'cell_type': np.tile([self._type_name(code) for code in codes], max_lag),
+                             'lag': np.repeat(lags, codes.shape[0]),
+                             'time_lag': np.repeat(self.times[lags] - self.times[0], codes.shape[0]),
+                             'msd': msd.reshape(-1),
+                             'n': counts.reshape(-1)})
+
+    def get_motility_summary(self):
+        """
+        Summarizes the motility of each cell type. The persistence time is
+        estimated from the mean cosine of the turning angles, which decays
+        as exp(-dt / persistence_time) for a persistent random walk; it is
+        NaN when the mean cosine is not positive.
+
+        Returns
+        -------
+        summary_df : pd.DataFrame, shape=[n_types, 6]
+            One row per cell type with columns 'cell_type', 'n_cells',
+            'mean_speed', 'mean_turning_angle', 'mean_cos_turning_angle' and
+            'persistence_time' (inf for straight tracks)
+        """
+        codes, speeds, _ = self._mean_by_type(self.get_speeds())
+        angles = self.get_turning_angles()
+        _, mean_angles, _ = self._mean_by_type(angles)
+        _, mean_cos, _ = self._mean_by_type(np.cos(angles))
+
+        dt = np.median(np.diff(self.times)) if self.times.shape[0] > 1 else np.nan
+        persistence = np.full(codes.shape[0], np.nan)
+        decaying = (mean_cos > 0) & (mean_cos < 1)
+        persistence[decaying] = -dt / np.log(mean_cos[decaying])
+        persistence[mean_cos >= 1] = np.inf
+
+        return pd.DataFrame({'cell_type': [self._type_name(code) for code in codes],
+                             'n_cells': np.bincount(np.searchsorted(codes, self.cell_type),
+                                                    minlength=codes.shape[0]),
+                             'mean_speed': speeds,
+                             'mean_turning_angle': mean_angles,
+                             'mean_cos_turning_angle': mean_cos,
+                             'persistence_time': persistence})
@@ -0,0 +1,316 @@
+#
+# pyMCDS_watch.py - follow the output of a running PhysiCell simulation
+#
+# Usage:
+#  python pyMCDS_watch.py [output_dir]
+#
+# Waits for new outputNNNNNNNN.xml/.mat sets and snapshotNNNNNNNN.svg files to
+# be completely written, reads only the new ones and prints a short summary of
+# each time step as it arrives. Stops once the simulation writes final.xml.
+#
+# On Linux the output directory is watched with inotify, elsewhere (or if the
+# directory does not exist yet) it is polled.
+#
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from matlab4 import read_matlab4_header
+
+# inotify event masks (rf. <sys/inotify.h>)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+
+
+class _Inotify:
+    """
+    Minimal inotify watch on one directory, used only to wake up when a file
+    in it has been written or moved into it.
+    """
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed for '{}'".format(path))
+
+    def wait(self, timeout):
+        """
+        Waits up to timeout seconds for events, returns True if there were any
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        # the events themselves are not needed, the watcher checks the files
+        while True:
+            try:
+                os.read(self.fd, 65536)
+            except BlockingIOError:
+                return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _matlab4_complete(path):
+    """
+    True if the level 4 .mat file at path holds its whole data block
+    """
+    try:
+        header = read_matlab4_header(path)
+    except (FileNotFoundError, ValueError):
+        return False
+    size = header['offset'] + header['rows'] * header['cols'] * header['dtype'].itemsize
+    return path.stat().st_size >= size
+
+
+def _svg_complete(path):
+    """
+    True if the svg file at path has been written up to its closing tag
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(path.stat().st_size - 64, 0))
+            return b'</svg>' in f.read()
+    except FileNotFoundError:
+        return False
+
+
+class OutputWatcher:
+    """
+    This class follows the output directory of a running simulation. Time
+    steps (outputNNNNNNNN.xml and the .mat files it references) and svg
+    snapshots are picked up once they are completely written. Only the new
+    ones are read, appended to the in-memory series and passed on to the
+    registered callbacks, e.g. to redraw a viewer or to update a summary.
+
+    Parameters
+    ----------
+    output_path: str, optional
+        String containing the path (relative or absolute) to the directory
+        where PhysiCell output files are stored (default= ".")
+    read_frames: bool, optional
+        If False, output*.xml time steps are not followed (default= True)
+    svg: bool, optional
+        If False, snapshot*.svg files are not followed (default= True)
+    poll_interval: float, optional
+        Seconds between checks when inotify is not available, and the
+        longest time between checks when it is (default= 1)
+    use_inotify: bool, optional
+        If False, always poll the directory (default= True)
+    **mcds_kwargs
+        Loading options passed on to every pyMCDS, e.g. cells=False or
+        cell_variables=['position', 'cell_type']
+
+    Attributes
+    ----------
+    frames : list (pyMCDS)
+        Time steps read so far, in output order. They share one mesh and are
+        read lazily.
+    svg_files : list (pathlib.Path)
+        Completely written svg snapshots so far, in output order
+    """
+    def __init__(self, output_path='.', read_frames=True, svg=True, poll_interval=1.,
+                 use_inotify=True, **mcds_kwargs):
+        self.output_path = Path(output_path)
+        self.poll_interval = poll_interval
+        self.frames = []
+        self.svg_files = []
+        self.mesh = None
+        self.schema = None
+        self._watch_frames = read_frames
+        self._watch_svg = svg
+        self._mcds_kwargs = mcds_kwargs
+        self._frame_callbacks = []
+        self._svg_callbacks = []
+
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(self.output_path)
+            except (OSError, AttributeError):
+                # not Linux, or the directory does not exist yet
+                self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops watching the directory
+        """
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def add_frame_callback(self, callback, replay=True):
+        """
+        Registers callback(mcds), called for every new time step
+
+        Parameters
+        ----------
+        callback : callable
+            Called with the pyMCDS of each new time step, in output order
+        replay : bool, optional
+            If True, callback is first called for the time steps that were
+            already read (default= True)
+        """
+        self._frame_callbacks.append(callback)
+        if replay:
+            for mcds in self.frames:
+                callback(mcds)
+
+    def add_svg_callback(self, callback, replay=True):
+        """
+        Registers callback(svg_file), called for every new svg snapshot
+
+        Parameters
+        ----------
+        callback : callable
+            Called with the path of each new svg snapshot, in output order
+        replay : bool, optional
+            If True, callback is first called for the snapshots that were
+            already found (default= True)
+        """
+        self._svg_callbacks.append(callback)
+        if replay:
+            for svg_file in self.svg_files:
+                callback(svg_file)
+
+    def _read_new_frame(self):
+        """
+        Returns the pyMCDS of the next time step if it is completely written,
+        None otherwise
+        """
+        from pyMCDS import pyMCDS
+
+        xml_file = 'output{:08d}.xml'.format(len(self.frames))
+        if not (self.output_path / xml_file).is_file():
+            return None
+        try:
+            mcds = pyMCDS(xml_file, self.output_path, mesh=self.mesh, schema=self.schema,
+                          **self._mcds_kwargs)
+        except ET.ParseError:
+            # the xml is still being written
+            return None
+
+        # a time step may reference no microenvironment or no cells file
+        if not all(_matlab4_complete(path) for path in mcds._get_data_files()
+                   if path is not None):
+            return None
+        if self.mesh is None:
+            self.mesh = mcds.data['mesh']
+            self.schema = mcds._schema
+        return mcds
+
+    def _read_new(self):
+        """
+        Reads everything that was completed since the last check and calls
+        the callbacks
+        """
+        new_frames = []
+        while self._watch_frames:
+            mcds = self._read_new_frame()
+            if mcds is None:
+                break
+            self.frames.append(mcds)
+            new_frames.append(mcds)
+            for callback in self._frame_callbacks:
+                callback(mcds)
+
+        new_svg_files = []
+        while self._watch_svg:
+            svg_file = self.output_path / 'snapshot{:08d}.svg'.format(len(self.svg_files))
+            if not _svg_complete(svg_file):
+                break
+            self.svg_files.append(svg_file)
+            new_svg_files.append(svg_file)
+            for callback in self._svg_callbacks:
+                callback(svg_file)
+
+        return new_frames, new_svg_files
+
+    def poll(self, timeout=0.):
+        """
+        Reads the time steps and snapshots completed since the last call,
+        waiting up to timeout seconds for at least one of them
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Longest time to wait, 0 checks once and returns (default= 0)
+
+        Returns
+        -------
+        new_frames : list (pyMCDS)
+            New time steps
+        new_svg_files : list (pathlib.Path)
+            New svg snapshots
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            new_frames, new_svg_files = self._read_new()
+            remaining = deadline - time.monotonic()
+            if len(new_frames) > 0 or len(new_svg_files) > 0 or remaining <= 0:
+                return new_frames, new_svg_files
+
+            wait = min(remaining, self.poll_interval)
+            if self._inotify is not None:
+                self._inotify.wait(wait)
+            else:
+                time.sleep(wait)
+
+    def watch(self, idle_timeout=None):
+        """
+        Follows the simulation until it writes final.xml, or until nothing
+        new has been written for idle_timeout seconds
+
+        Parameters
+        ----------
+        idle_timeout : float, optional
+            Seconds without new output after which to stop (default= None,
+            wait for final.xml)
+
+        Returns
+        -------
+        frames : list (pyMCDS)
+            All time steps read
+        """
+        last_new = time.monotonic()
+        while True:
+            new_frames, new_svg_files = self.poll(self.poll_interval)
+            if len(new_frames) > 0 or len(new_svg_files) > 0:
+                last_new = time.monotonic()
+            elif (self.output_path / 'final.xml').is_file():
+                # the last time step is written before final.xml
+                self._read_new()
+                return self.frames
+            elif idle_timeout is not None and time.monotonic() - last_new > idle_timeout:
+                return self.frames
+
+
+if __name__ == '__main__':
+    output_path = sys.argv[1] if len(sys.argv) > 1 else '.'
+
+    def print_summary(mcds):
+        summary = mcds.get_substrate_summary()
+        means = ', '.join('{}={:.4g}'.format(name, mean)
+                          for name, mean in zip(summary['substrate'], summary['mean']))
+        print('t={:g} {}: {} cells, {}'.format(
+            mcds.get_time(), mcds.data['metadata']['time_units'],
+            len(mcds.data['discrete_cells']['ID']), means))
+
+    with OutputWatcher(output_path, svg=False, cell_variables=['ID']) as watcher:
+        watcher.add_frame_callback(print_summary)
+        watcher.watch()
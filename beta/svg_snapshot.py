@@ -0,0 +1,141 @@
+"""
+Fast reader for the snapshotNNNNNNNN.svg files written by PhysiCell
+(rf. core/PhysiCell_SVG.cpp, modules/PhysiCell_pathology.cpp). Instead of
+building an ElementTree of the whole drawing, the bytes of the cells group
+are scanned with one regular expression and the coordinates, radii and
+fills of all circles are converted to numpy arrays at once. Fill strings are
+interned into a palette, so each distinct color is parsed only once.
+
+The scanner relies on the layout PhysiCell writes: one <g id="cellN"> group
+per cell holding its cytoplasm circle and, optionally, its nucleus circle,
+each with its cx, cy and r attributes first.
+"""
+import html
+import re
+
+import numpy as np
+
+_time_pattern = re.compile(rb'(Current time:[^<]*)')
+_size_pattern = re.compile(rb'<svg\b[^>]*?\swidth="([^"]*)"[^>]*?\sheight="([^"]*)"')
+# the coordinates are captured as one 'cx="..." cy="..." r="..."' string per
+# circle, so that they can all be parsed by numpy in one call
+_circle = rb'<circle (cx="[^"]*" cy="[^"]*" r="[^"]*")[^>]*\sfill="([^"]*)"'
+_cell_pattern = re.compile(rb'<g id="cell(\d+)"[^>]*>\s*' + _circle)
+_nucleus_pattern = re.compile(rb'<g id="cell(\d+)"[^>]*>\s*' + _circle + rb'[^>]*>(?:\s*' + _circle + rb')?')
+
+
+def _parse_coordinates(coordinates):
+    """
+    Converts the captured coordinates of circles to an [n_circles, 3] array
+    """
+    xyr = np.fromstring(b' '.join(coordinates).translate(None, b'cxyr="'), sep=' ')
+    return xyr.reshape(-1, 3)
+
+
+def _intern(fills):
+    """
+    Returns the distinct fills, in order of appearance, and the index of
+    each fill among them
+    """
+    palette = list(dict.fromkeys(fills))
+    index = {color: i for i, color in enumerate(palette)}
+    return palette, np.fromiter(map(index.__getitem__, fills), dtype=np.intp, count=len(fills))
+
+
+def read_svg_snapshot(filename, nucleus=False):
+    """
+    Reads the cells of a PhysiCell svg snapshot into arrays. Cells drawn
+    with other shapes than circles, e.g. PhysiMeSS fibres, are skipped.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the snapshotNNNNNNNN.svg file
+    nucleus : bool, optional
+        If True, the nucleus circles are returned too, after the cytoplasm
+        circle of their cell (default= False)
+
+    Returns
+    -------
+    snapshot : dict
+        Contains the 'time' header text (e.g. 'Current time: 0 days, 1
+        hours, and 0.00 minutes, z = 0.00 μm', None if missing), the
+        'width' and 'height' of the drawing, the number of cells
+        'n_cells', the 'palette' (list of the distinct fill strings, in
+        order of appearance) and one entry per circle in the arrays 'cx',
+        'cy', 'r' (float), 'fill' (int, index into the palette) and 'ID'
+        (int, ID of the cell the circle belongs to)
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    time_match = _time_pattern.search(data)
+    time_text = None
+    if time_match is not None:
+        time_text = ' '.join(html.unescape(time_match.group(1).decode('utf-8')).split())
+    size_match = _size_pattern.search(data)
+    width, height = (float(size) for size in size_match.groups()) if size_match else (None, None)
+
+    start = max(data.find(b'<g id="cells"'), 0)
+    if not nucleus:
+        cells = _cell_pattern.findall(data, start)
+        columns = list(zip(*cells)) if len(cells) > 0 else [()] * 3
+        ids = np.array(columns[0]).astype(np.int64)
+        xyr = _parse_coordinates(columns[1])
+        palette, fill = _intern(columns[2])
+    else:
+        cells = _nucleus_pattern.findall(data, start)
+        columns = list(zip(*cells)) if len(cells) > 0 else [()] * 5
+        cell_ids = np.array(columns[0]).astype(np.int64)
+        has_nucleus = np.array([coordinates != b'' for coordinates in columns[3]], dtype=bool)
+        nuclei = np.flatnonzero(has_nucleus)
+
+        # each nucleus follows the cytoplasm circle of its cell
+        first = np.arange(cell_ids.shape[0]) + np.cumsum(has_nucleus) - has_nucleus
+        second = first[has_nucleus] + 1
+        n_circles = cell_ids.shape[0] + second.shape[0]
+        ids = np.zeros(n_circles, dtype=np.int64)
+        xyr = np.zeros((n_circles, 3))
+        ids[first], ids[second] = cell_ids, cell_ids[has_nucleus]
+        xyr[first] = _parse_coordinates(columns[1])
+        xyr[second] = _parse_coordinates([columns[3][i] for i in nuclei])
+
+        fills = list(columns[2]) + [columns[4][i] for i in nuclei]
+        palette, fill = _intern(fills)
+        fill[np.concatenate((first, second))] = fill.copy()
+
+    return {'time': time_text,
+            'width': width,
+            'height': height,
+            'n_cells': len(cells),
+            'palette': [color.decode('ascii') for color in palette],
+            'cx': xyr[:, 0],
+            'cy': xyr[:, 1],
+            'r': xyr[:, 2],
+            'fill': fill,
+            'ID': ids}
+
+
+def palette_to_rgb(palette):
+    """
+    Converts the fill strings of a palette, either 'rgb(r,g,b)' or color
+    names, to RGB values
+
+    Parameters
+    ----------
+    palette : list (str)
+        Fill strings, as returned in read_svg_snapshot()['palette']
+
+    Returns
+    -------
+    rgb : array (float) shape=[n_colors, 3]
+        Red, green and blue of each color, between 0 and 1
+    """
+    rgb = np.zeros((len(palette), 3))
+    for i, color in enumerate(palette):
+        if color.startswith('rgb('):
+            rgb[i] = [int(value) / 255. for value in color[4:-1].split(',')]
+        else:
+            import matplotlib.colors as mplc
+            rgb[i] = mplc.to_rgb(color)
+    return rgb
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmark_pyMCDS import write_synthetic_output
+
+
+@pytest.fixture
+def output_path(tmp_path):
+    """
+    A small synthetic PhysiCell output directory with three time steps
+    """
+    return write_synthetic_output(tmp_path / 'output', n_vox=8, n_substrates=2, n_cells=200,
+                                  n_frames=3)
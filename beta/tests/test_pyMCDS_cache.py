@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pyMCDS import pyMCDS
+
+
+def test_cache_concurrent_threads(output_path):
+    reference = pyMCDS('output00000001.xml', output_path, lazy=False).get_cell_df()
+
+    def load(_):
+        return pyMCDS('output00000001.xml', output_path, cache=True, lazy=False).get_cell_df()
+
+    for trial in range(5):
+        for cache_file in (output_path / '.pyMCDS_cache').glob('*'):
+            cache_file.unlink()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            cells_dfs = list(executor.map(load, range(8)))
+        for cells_df in cells_dfs:
+            assert cells_df.equals(reference)
+
+    cache_files = sorted(f.name for f in (output_path / '.pyMCDS_cache').glob('*'))
+    assert not any(name.endswith('.tmp') for name in cache_files)
+
+
+def test_cache_replaces_stale_entries(output_path):
+    first = pyMCDS('output00000001.xml', output_path, cache=True, lazy=False)
+    cell_path = output_path / 'output00000001_cells.mat'
+    stat = cell_path.stat()
+    np.testing.assert_array_equal(
+        first.data['discrete_cells']['ID'],
+        pyMCDS('output00000001.xml', output_path, cache=True, lazy=False).data['discrete_cells']['ID'])
+
+    # a rewritten source file gets a new entry, the old one is removed
+    os.utime(cell_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pyMCDS('output00000001.xml', output_path, cache=True, lazy=False)
+    entries = list((output_path / '.pyMCDS_cache').glob('output00000001_cells-*.npy'))
+    assert len(entries) == 1
+    assert entries[0].name.endswith('-{}.npy'.format(stat.st_mtime_ns + 10**9))
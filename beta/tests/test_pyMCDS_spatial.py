@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pyMCDS import pyMCDS
+from pyMCDS_spatial import cross_statistics, find_clusters
+from pyMCDS_timeseries import pyMCDS_timeseries
+
+
+def test_cross_statistics_type_name_and_code(output_path):
+    mcds = pyMCDS('output00000000.xml', output_path, microenv=False)
+    radii = [20., 40., 80.]
+    stats_df = cross_statistics(mcds, [('type_1', 'type_1'), ('type_1', 1), (1, 'type_1')], radii)
+    for _, pair_df in stats_df.groupby(['type_a', 'type_b'], sort=False):
+        np.testing.assert_array_equal(pair_df['pairs'], stats_df['pairs'][:len(radii)])
+        np.testing.assert_array_equal(pair_df['K'], stats_df['K'][:len(radii)])
+    assert (stats_df['n_b'] == stats_df['n_a']).all()
+
+
+def test_find_clusters_min_size(output_path):
+    mcds = pyMCDS('output00000000.xml', output_path, microenv=False)
+    labels, clusters_df = find_clusters(mcds, tolerance=10., min_size=2)
+    assert len(clusters_df) > 0 and (clusters_df['size'] >= 2).all()
+    assert np.bincount(labels[labels >= 0]).tolist() == clusters_df['size'].tolist()
+    for min_size in (0, -1):
+        with pytest.raises(ValueError):
+            find_clusters(mcds, min_size=min_size)
+
+
+def test_get_clusters_min_size(output_path):
+    ts = pyMCDS_timeseries(output_path, microenv=False)
+    clusters_df = ts.get_clusters(tolerance=10., min_size=2, n_workers=2, processes=False)
+    assert sorted(clusters_df['time'].unique()) == [0., 60., 120.]
+    with pytest.raises(ValueError):
+        ts.get_clusters(min_size=0)
@@ -0,0 +1,20 @@
+import numpy as np
+
+from pyMCDS import pyMCDS
+from pyMCDS_manifest import manifest_name
+from pyMCDS_store import pack_output, pyMCDS_store
+
+
+def test_pack_output_round_trip(output_path, tmp_path):
+    store = pyMCDS_store(pack_output(output_path, tmp_path / 'store'))
+    assert (output_path / manifest_name).is_file()
+    assert store.get_times() == [0., 60., 120.]
+    np.testing.assert_array_equal(store.get_cell_counts(), [200, 200, 200])
+
+    for t, xml_file in enumerate(store.xml_files):
+        mcds = pyMCDS(xml_file, output_path)
+        packed = store.get_mcds(t)
+        assert packed.get_cell_df().equals(mcds.get_cell_df())
+        for species_name in mcds.get_substrate_names():
+            np.testing.assert_array_equal(packed.get_concentrations(species_name),
+                                          mcds.get_concentrations(species_name))
@@ -0,0 +1,40 @@
+import re
+
+from pyMCDS_watch import OutputWatcher
+
+
+def _drop_cells_file(xml_path):
+    xml = xml_path.read_text()
+    xml_path.write_text(re.sub(r'<filename>[^<]*_cells\.mat</filename>', '', xml))
+
+
+def test_watch_reads_completed_frames(output_path):
+    with OutputWatcher(output_path, svg=False, use_inotify=False, cells=False) as watcher:
+        new_frames, new_svg_files = watcher.poll()
+    assert len(new_frames) == 3
+    assert new_svg_files == []
+    assert [mcds.get_time() for mcds in watcher.frames] == [0., 60., 120.]
+
+
+def test_watch_frame_without_cells_file(output_path):
+    _drop_cells_file(output_path / 'output00000001.xml')
+    with OutputWatcher(output_path, svg=False, use_inotify=False, cells=False) as watcher:
+        new_frames, _ = watcher.poll()
+    assert len(new_frames) == 3
+    assert watcher.frames[1]._get_data_files()[1] is None
+
+
+def test_watch_waits_for_incomplete_mat_file(output_path):
+    cell_path = output_path / 'output00000002_cells.mat'
+    cell_path.write_bytes(cell_path.read_bytes()[:100])
+    with OutputWatcher(output_path, svg=False, use_inotify=False, cells=False) as watcher:
+        new_frames, _ = watcher.poll()
+    assert len(new_frames) == 2
+
+
+def test_watch_svg_only(output_path):
+    (output_path / 'snapshot00000000.svg').write_text('<svg width="10" height="10"></svg>\n')
+    with OutputWatcher(output_path, read_frames=False, use_inotify=False) as watcher:
+        new_frames, new_svg_files = watcher.poll()
+    assert new_frames == [] and watcher.frames == []
+    assert new_svg_files == [output_path / 'snapshot00000000.svg']
@@ -14,7 +14,6 @@ from matplotlib.patches import Circle, Ellipse, Rectangle
 from matplotlib.collections import PatchCollection
 import matplotlib.colors as mplc
 from matplotlib import gridspec
-from collections import deque
 
 from PyQt5 import QtCore, QtGui
 from PyQt5.QtWidgets import QFrame,QApplication,QWidget,QTabWidget,QFormLayout,QLineEdit, QHBoxLayout,QVBoxLayout, \
@@ -31,6 +30,9 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 # from PyQt5 import QtCore, QtWidgets
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+
+from pyMCDS_watch import OutputWatcher
+from svg_snapshot import read_svg_snapshot, palette_to_rgb
 # from matplotlib.figure import Figure
 
 class Vis(QWidget):
@@ -44,6 +46,7 @@ class Vis(QWidget):
         self.timer = QtCore.QTimer()
         # self.t.timeout.connect(self.task)
         self.timer.timeout.connect(self.play_plot_cb)
+        self.watcher = None   # follows new snapshots of a running simulation
 
         # self.tab = QWidget()
         # self.tabs.resize(200,5)
@@ -162,6 +165,10 @@ class Vis(QWidget):
         # self.play_button.clicked.connect(self.play_plot_cb)
         self.reset_button.clicked.connect(self.reset_plot_cb)
         controls_hbox.addWidget(self.reset_button)
+
+        self.live_toggle = QCheckBox("live")
+        self.live_toggle.setChecked(False)
+        controls_hbox.addWidget(self.live_toggle)
         controls_vbox.addLayout(controls_hbox)
 
         #-------------
@@ -254,6 +261,7 @@ class Vis(QWidget):
             return
 
         self.output_dir = dir_path
+        self.set_watcher(None)
 
         self.output_dir_w.setText(self.output_dir)
         # Verify initial.xml and at least one .svg file exist. Obtain bounds from initial.xml
@@ -359,6 +367,7 @@ class Vis(QWidget):
     def reset_plot_cb(self, text):
         print("-------------- reset_plot_cb() ----------------")
         # self.create_figure()
+        self.set_watcher(None)
 
         xml_file = Path(self.output_dir, "initial.xml")
         if not os.path.isfile(xml_file):
@@ -448,7 +457,16 @@ class Vis(QWidget):
             # with debug_view:
                 # print("plot_svg:", full_fname) 
             # print("-- plot_svg:", full_fname) 
-            if not os.path.isfile(full_fname):
+            if self.live_toggle.isChecked():
+                # a running simulation: wait (on the next tick) until the
+                # snapshot has been completely written instead of stopping
+                if self.watcher is None:
+                    self.set_watcher(OutputWatcher(self.output_dir, read_frames=False))
+                self.watcher.poll()
+                if len(self.watcher.svg_files) <= self.current_svg_frame:
+                    self.frame_count -= 1
+                    return
+            elif not os.path.isfile(full_fname):
                 # print("Once output files are generated, click the slider.")   
                 print("ERROR:  filename not found.")
                 self.frame_count -= 1
@@ -460,6 +478,11 @@ class Vis(QWidget):
             self.canvas.update()
             self.canvas.draw()
 
+    def set_watcher(self, watcher):
+        if self.watcher is not None:
+            self.watcher.close()
+        self.watcher = watcher
+
     def animate(self, text):
         self.frame_count = 0
         # self.timer = QtCore.QTimer()
@@ -640,116 +663,30 @@ class Vis(QWidget):
         # self.ax0.cla()
         # self.title_str = ""
 
-        xlist = deque()
-        ylist = deque()
-        rlist = deque()
-        rgb_list = deque()
-
-        #  print('\n---- ' + fname + ':')
-#        tree = ET.parse(fname)
-        tree = ET.parse(full_fname)
-        root = tree.getroot()
-        #  print('--- root.tag ---')
-        #  print(root.tag)
-        #  print('--- root.attrib ---')
-        #  print(root.attrib)
-        #  print('--- child.tag, child.attrib ---')
-        numChildren = 0
-        for child in root:
-            #    print(child.tag, child.attrib)
-            #    print("keys=",child.attrib.keys())
-            if self.use_defaults and ('width' in child.attrib.keys()):
-                self.axes_max = float(child.attrib['width'])
-                # print("debug> found width --> axes_max =", axes_max)
-            if child.text and "Current time" in child.text:
-                svals = child.text.split()
-                # remove the ".00" on minutes
-                self.title_str += "   cells: " + svals[2] + "d, " + svals[4] + "h, " + svals[7][:-3] + "m"
-
-                # self.cell_time_mins = int(svals[2])*1440 + int(svals[4])*60 + int(svals[7][:-3])
-                # self.title_str += "   cells: " + str(self.cell_time_mins) + "m"   # rwh
-
-            # print("width ",child.attrib['width'])
-            # print('attrib=',child.attrib)
-            # if (child.attrib['id'] == 'tissue'):
-            if ('id' in child.attrib.keys()):
-                # print('-------- found tissue!!')
-                tissue_parent = child
-                break
-
-        # print('------ search tissue')
-        cells_parent = None
-
-        for child in tissue_parent:
-            # print('attrib=',child.attrib)
-            if (child.attrib['id'] == 'cells'):
-                # print('-------- found cells, setting cells_parent')
-                cells_parent = child
-                break
-            numChildren += 1
-
-        num_cells = 0
-        #  print('------ search cells')
-        for child in cells_parent:
-            #    print(child.tag, child.attrib)
-            #    print('attrib=',child.attrib)
-            for circle in child:  # two circles in each child: outer + nucleus
-                #  circle.attrib={'cx': '1085.59','cy': '1225.24','fill': 'rgb(159,159,96)','r': '6.67717','stroke': 'rgb(159,159,96)','stroke-width': '0.5'}
-                #      print('  --- cx,cy=',circle.attrib['cx'],circle.attrib['cy'])
-                xval = float(circle.attrib['cx'])
-
-                # map SVG coords into comp domain
-                # xval = (xval-self.svg_xmin)/self.svg_xrange * self.x_range + self.xmin
-                xval = xval/self.x_range * self.x_range + self.xmin
-
-                s = circle.attrib['fill']
-                # print("s=",s)
-                # print("type(s)=",type(s))
-                if (s[0:3] == "rgb"):  # if an rgb string, e.g. "rgb(175,175,80)" 
-                    rgb = list(map(int, s[4:-1].split(",")))  
-                    rgb[:] = [x / 255. for x in rgb]
-                else:     # otherwise, must be a color name
-                    rgb_tuple = mplc.to_rgb(mplc.cnames[s])  # a tuple
-                    rgb = [x for x in rgb_tuple]
-
-                # test for bogus x,y locations (rwh TODO: use max of domain?)
-                too_large_val = 10000.
-                if (np.fabs(xval) > too_large_val):
-                    print("bogus xval=", xval)
-                    break
-                yval = float(circle.attrib['cy'])
-                # yval = (yval - self.svg_xmin)/self.svg_xrange * self.y_range + self.ymin
-                yval = yval/self.y_range * self.y_range + self.ymin
-                if (np.fabs(yval) > too_large_val):
-                    print("bogus xval=", xval)
-                    break
-
-                rval = float(circle.attrib['r'])
-                # if (rgb[0] > rgb[1]):
-                #     print(num_cells,rgb, rval)
-                xlist.append(xval)
-                ylist.append(yval)
-                rlist.append(rval)
-                rgb_list.append(rgb)
-
-                # For .svg files with cells that *have* a nucleus, there will be a 2nd
-                if (not self.show_nucleus):
-                #if (not self.show_nucleus):
-                    break
-
-            num_cells += 1
-
-            # if num_cells > 3:   # for debugging
-            #   print(fname,':  num_cells= ',num_cells," --- debug exit.")
-            #   sys.exit(1)
-            #   break
-
-            # print(fname,':  num_cells= ',num_cells)
-
-        xvals = np.array(xlist)
-        yvals = np.array(ylist)
-        rvals = np.array(rlist)
-        rgbs = np.array(rgb_list)
+        snapshot = read_svg_snapshot(full_fname, nucleus=self.show_nucleus)
+        if self.use_defaults:
+            self.axes_max = snapshot['width']
+        svals = snapshot['time'].split()
+        # remove the ".00" on minutes
+        self.title_str += "   cells: " + svals[2] + "d, " + svals[4] + "h, " + svals[7][:-3] + "m"
+
+        # map SVG coords into comp domain
+        # xval = (xval-self.svg_xmin)/self.svg_xrange * self.x_range + self.xmin
+        xvals = snapshot['cx']/self.x_range * self.x_range + self.xmin
+        # yval = (yval - self.svg_xmin)/self.svg_xrange * self.y_range + self.ymin
+        yvals = snapshot['cy']/self.y_range * self.y_range + self.ymin
+
+        # test for bogus x,y locations (rwh TODO: use max of domain?)
+        too_large_val = 10000.
+        valid = (np.fabs(xvals) <= too_large_val) & (np.fabs(yvals) <= too_large_val)
+        for xval in xvals[~valid]:
+            print("bogus xval=", xval)
+
+        num_cells = snapshot['n_cells']
+        xvals = xvals[valid]
+        yvals = yvals[valid]
+        rvals = snapshot['r'][valid]
+        rgbs = palette_to_rgb(snapshot['palette'])[snapshot['fill'][valid]]
         # print("xvals[0:5]=",xvals[0:5])
         # print("rvals[0:5]=",rvals[0:5])
         # print("rvals.min, max=",rvals.min(),rvals.max())
@@ -24,11 +24,10 @@ xml_files.sort()
 #print('xml_files = ',xml_files)
 
 ds_count = len(xml_files)
-ds_count = 192
 print("----- ds_count = ",ds_count)
 mcds = [pyMCDS_cells(xml_files[i], data_dir) for i in range(ds_count)]
 
-tval = np.linspace(0, mcds[-1].get_time(), ds_count)
+tval = np.array([mcds[idx].get_time() for idx in range(ds_count)])
 print('tval= ',tval)
 
 # count epi cells still live 